@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of report insert throughput as the table grows, with random and time-ordered primary keys.
+
+Random (version 4) UUIDs are inserted all over the primary key index, so once it no longer fits in memory, most inserts touch a page which has to be read from disk.
+Time-ordered (version 7) UUIDs are always inserted at the end of the index. The difference only shows once the table is large, so the default is 10 million rows per scheme.
+
+The reports table is dropped and recreated for each scheme. It uses a temporary SQLite database, unless a settings module is given with ``DJANGO_SETTINGS_MODULE``.
+
+Usage: ``python benchmarks/insert_throughput.py [--rows N] [--batch-size N] [--interval N]``
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+
+
+
+def setup ():
+	if 'DJANGO_SETTINGS_MODULE' not in os.environ:
+		settings.configure(
+			INSTALLED_APPS=['lookout'],
+			USE_TZ=True,
+			DATABASES={
+				'default': {
+					'ENGINE': 'django.db.backends.sqlite3',
+					'NAME': os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+				}
+			}
+		)
+
+	django.setup()
+
+	call_command('migrate', 'lookout', verbosity=0)
+
+
+def insert (make_uuid, rows: int, batch_size: int, interval: int):
+	""" Inserts ``rows`` reports into an empty table, yielding the number of rows inserted per second over each ``interval`` rows. """
+
+	from lookout.models import Report
+
+	with connection.schema_editor() as schema_editor:
+		schema_editor.delete_model(Report)
+		schema_editor.create_model(Report)
+
+	body = {'type': 'csp', 'age': 10, 'url': 'https://example.com/', 'body': {'blocked': 'https://evil.com/evil.js', 'directive': 'script-src'}}
+	now = datetime.now(timezone.utc)
+
+	inserted = 0
+	started = time.perf_counter()
+
+	while inserted < rows:
+		batch = []
+
+		for i in range(min(batch_size, rows - inserted)):
+			# Reports arrive about a millisecond apart
+			created_time = now + timedelta(milliseconds=inserted + i)
+
+			batch.append(Report(
+				uuid=make_uuid(created_time),
+				created_time=created_time,
+				incident_time=created_time,
+				type='csp',
+				url='https://example.com/',
+				body=body,
+				directive='script-src'
+			))
+
+		Report.objects.bulk_create(batch)
+		inserted += len(batch)
+
+		if inserted % interval == 0 or inserted == rows:
+			finished = time.perf_counter()
+			yield inserted, (inserted - 1) % interval + 1, finished - started
+			started = finished
+
+
+def main ():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--rows', type=int, default=10000000, help="Number of reports inserted with each scheme.")
+	parser.add_argument('--batch-size', type=int, default=1000, help="Number of reports inserted per query.")
+	parser.add_argument('--interval', type=int, default=1000000, help="Number of reports between measurements.")
+	args = parser.parse_args()
+
+	setup()
+
+	from lookout.utils import uuid7
+
+	schemes = [
+		('uuid4', lambda created_time: uuid.uuid4()),
+		('uuid7', uuid7)
+	]
+
+	results = {}
+
+	for name, make_uuid in schemes:
+		results[name] = []
+
+		for inserted, count, seconds in insert(make_uuid, args.rows, args.batch_size, args.interval):
+			results[name].append((inserted, count / seconds))
+			print("{}: {} rows, {:.0f} rows/s".format(name, inserted, count / seconds), file=sys.stderr)
+
+	print("{:>12} {:>14} {:>14} {:>8}".format('rows', 'uuid4 (rows/s)', 'uuid7 (rows/s)', 'speedup'))
+
+	for (inserted, before), (_, after) in zip(results['uuid4'], results['uuid7']):
+		print("{:>12} {:>14.0f} {:>14.0f} {:>7.2f}x".format(inserted, before, after, after / before))
+
+
+
+if __name__ == '__main__':
+	main()
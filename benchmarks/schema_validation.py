@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Microbenchmark of the per-report cost of schema matching.
+
+Compares the previous approach, which built each schema dictionary and validator on every check, with the validators compiled when schemas are registered.
+
+Usage: ``python benchmarks/schema_validation.py [--number N]``
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import jsonschema
+from django.utils.functional import cached_property
+
+from lookout.report_schemas import report_schema_registry
+
+
+
+def uncached_schema (schema):
+	""" Builds a schema's dictionary the way it was built before being cached. """
+
+	descriptor = type(schema).schema
+
+	if isinstance(descriptor, cached_property):
+		return descriptor.func(schema)
+
+	return descriptor
+
+
+def match_uncached (report_data):
+	""" The previous implementation of ``ReportSchemaRegistry.get_matching_schema``. """
+
+	for schema in report_schema_registry.values():
+		try:
+			jsonschema.validate(report_data, uncached_schema(schema))
+		except jsonschema.ValidationError:
+			continue
+		else:
+			return schema
+
+
+def match_cached (report_data):
+	return report_schema_registry.get_matching_schema(report_data)
+
+
+def main ():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--number', type=int, default=1000, help="Number of times each report is matched.")
+	args = parser.parse_args()
+
+	fixture_dir = ROOT / 'lookout' / 'fixtures' / 'report_tests'
+
+	print("{:<24} {:<12} {:>12} {:>12} {:>8}".format('fixture', 'schema', 'before (µs)', 'after (µs)', 'speedup'))
+
+	for fixture_file in sorted(fixture_dir.glob('*.json')):
+		report_datum = json.loads(fixture_file.read_text())
+
+		if not isinstance(report_datum, list):
+			report_datum = [report_datum]
+
+		for report_data in report_datum:
+			schema = match_cached(report_data)
+			assert match_uncached(report_data) is schema
+
+			before = timeit.timeit(lambda: match_uncached(report_data), number=args.number) / args.number * 1e6
+			after = timeit.timeit(lambda: match_cached(report_data), number=args.number) / args.number * 1e6
+
+			print("{:<24} {:<12} {:>12.1f} {:>12.1f} {:>7.1f}x".format(fixture_file.stem, schema.type, before, after, before / after))
+
+
+
+if __name__ == '__main__':
+	main()
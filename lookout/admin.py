@@ -1,9 +1,38 @@
 import typing
 
+from django.apps import apps
 from django.contrib import admin
 from django.http import HttpRequest
 
-from .models import Report
+from .models import Report, ReportAggregate, Issue, rollup_models
+
+
+
+class DirectiveFilter(admin.SimpleListFilter):
+	"""
+	Filters reports by their CSP directive.
+	The choices are the directives counted by the longest of the ``ROLLUP_PERIODS``, rather than every report's, so it's hidden if none are enabled.
+	"""
+
+	title = "directive"
+	parameter_name = 'directive'
+
+
+	def lookups (self, request, model_admin) -> typing.List[typing.Tuple[str, str]]:
+		periods = [period for period in rollup_models if period in apps.get_app_config('lookout').ROLLUP_PERIODS]
+
+		if not periods:
+			return []
+
+		directives = rollup_models[periods[-1]].objects.exclude(directive='').order_by('directive').values_list('directive', flat=True).distinct()
+		return [(directive, directive) for directive in directives]
+
+
+	def queryset (self, request, queryset):
+		if self.value():
+			return queryset.filter(directive=self.value())
+
+		return queryset
 
 
 
@@ -14,14 +43,14 @@ class ReportAdmin(admin.ModelAdmin):
 	empty_value_display = '<i>[empty]</i>'
 
 	list_display = ['created_time', 'type']
-	list_filter = ['created_time', 'incident_time', 'type']
+	list_filter = ['created_time', 'incident_time', 'type', DirectiveFilter]
 
 	save_on_top = True
 	actions = None
 
 	fieldsets = [
 		[None, {
-			'fields': ['created_time', 'incident_time', 'type', 'url']
+			'fields': ['created_time', 'incident_time', 'type', 'url', 'issue']
 		}],
 		["Details", {
 			'description': "The report's full contents.",
@@ -54,3 +83,37 @@ class ReportAdmin(admin.ModelAdmin):
 	def has_delete_permission(self, request, obj=None):
 		""" Disables the ability to delete reports through the admin. """
 		return False
+
+
+
+@admin.register(ReportAggregate)
+class ReportAggregateAdmin(ReportAdmin):
+	date_hierarchy = 'last_seen'
+
+	list_display = ['last_seen', 'type', 'url', 'count']
+	list_filter = ['first_seen', 'last_seen', 'type']
+
+	fieldsets = [
+		[None, {
+			'fields': ['first_seen', 'last_seen', 'count', 'type', 'url']
+		}],
+		["Details", {
+			'description': "The first report's full contents.",
+			'fields': ['pretty_body'],
+		}]
+	]
+
+
+
+@admin.register(Issue)
+class IssueAdmin(ReportAdmin):
+	date_hierarchy = 'first_seen'
+
+	list_display = ['title', 'type', 'first_seen', 'last_seen', 'count']
+	list_filter = ['first_seen', 'last_seen', 'type']
+
+	fieldsets = [
+		[None, {
+			'fields': ['title', 'type', 'first_seen', 'last_seen', 'count']
+		}]
+	]
@@ -1,9 +1,9 @@
-from collections import Mapping
+from collections.abc import Mapping
 
 from django.apps import AppConfig
 from django.conf import settings as project_settings
 from django.core.exceptions import ImproperlyConfigured
-from django.core.checks import Warning, register as register_check
+from django.core.checks import Tags, Warning, register as register_check
 
 
 
@@ -18,6 +18,99 @@ class DjangoLookoutConfig(AppConfig):
 	SAVE_REPORTS = True
 	""" Whether the Django-Lookout should always save new reports as ``lookout.models.Report`` instances. """
 
+	GROUP_ISSUES = False
+	""" Whether new reports should be grouped into ``lookout.models.Issue`` instances as they're saved. """
+
+	AGGREGATE_REPORTS = False
+	""" Whether new reports should be counted as occurrences of identical reports, as ``lookout.models.ReportAggregate`` instances, instead of being saved individually. """
+
+	TIME_ORDERED_UUIDS = False
+	""" Whether new reports should be given version 7 UUIDs, which are ordered by when the report was submitted, instead of random ones. """
+
+	BODY_INDEX = False
+	""" Whether report bodies should be given a GIN index on PostgreSQL, which serves ``body__contains`` and ``body__has_key`` lookups. """
+
+	ROLLUP_PERIODS = ()
+	""" The periods, out of ``'minute'``, ``'hour'``, and ``'day'``, for which the number of new reports is counted as they're saved. """
+
+	RETENTION = {}
+	""" The number of days reports of each type are kept, like ``{'csp': 30}``, before the ``lookout_prune`` command deletes them. Other types are kept forever. """
+
+	ROLLUP_RETENTION = {'minute': 7}
+	""" The number of days the rollups of each period are kept, like ``{'minute': 7, 'hour': 90}``, before the ``lookout_prune`` command deletes them. Other periods are kept forever. """
+
+	BUFFER_REPORTS = False
+	""" Whether new reports should be queued and saved in batches by a background thread instead of during the request. """
+
+	BUFFER_MAX_SIZE = 10000
+	""" The maximum number of reports waiting in the buffer. Reports which don't fit are saved during the request. """
+
+	BUFFER_FLUSH_INTERVAL = 1.0
+	""" The maximum number of seconds a report waits in the buffer before it's saved. """
+
+	BUFFER_HIGH_WATER_MARK = 0.9
+	""" The fraction of ``BUFFER_MAX_SIZE`` at which the buffer is considered full and new reports are rejected. """
+
+	MAX_IN_FLIGHT_WRITES = None
+	""" The number of concurrent database writes at which new reports are rejected. ``None`` means there's no limit. """
+
+	MAX_WRITE_LATENCY = None
+	""" The average number of seconds per database write at which new reports are rejected. ``None`` means there's no limit. """
+
+	RETRY_AFTER = 10
+	""" The number of seconds clients are asked to wait before resending rejected reports. """
+
+	SCHEMA_ENGINE = 'jsonschema'
+	""" The engine used to validate reports against schemas: ``'jsonschema'``, or ``'codegen'`` to compile schemas into specialized Python code. """
+
+	SCHEMA_CACHE_SIZE = 1024
+	""" The number of report shapes for which the matching schema is remembered. ``0`` disables the cache. """
+
+	ADAPTIVE_SCHEMA_ORDER = False
+	""" Whether schemas which match the most reports should be tried first. """
+
+	SCHEMA_REORDER_INTERVAL = 1000
+	""" The number of matched reports between each update of the schema order, when ``ADAPTIVE_SCHEMA_ORDER`` is enabled. """
+
+	STREAM_REPORTS = False
+	""" Whether batches of reports should be decoded and saved ``BATCH_SIZE`` at a time as the request body is read, rather than all at once. """
+
+	MAX_BODY_SIZE = 1048576
+	""" The maximum size of a request body in bytes. ``None`` means there's no limit. """
+
+	MAX_REPORTS_PER_REQUEST = 1000
+	""" The maximum number of reports in a single request. ``None`` means there's no limit. """
+
+	ALLOWED_CONTENT_TYPES = ('application/json', 'application/csp-report', 'application/reports+json')
+	""" The content types accepted by the HTTP endpoint. Requests without a content type are still accepted. ``None`` accepts any content type. """
+
+	MAX_DECOMPRESSED_SIZE = 10485760
+	""" The maximum size in bytes of a ``gzip`` or ``deflate`` compressed request body after it's decompressed. ``None`` means there's no limit. """
+
+	MAX_COMPRESSION_RATIO = 100
+	""" The maximum ratio of a compressed request body's decompressed size to its compressed size. ``None`` means there's no limit. """
+
+	SAMPLE_RATES = {}
+	""" The fraction of reports of each type which are kept, like ``{'csp': 0.1}``. Other types are always kept. """
+
+	RATE_LIMITS = {}
+	""" The maximum number of reports of each type kept per period in seconds, like ``{'csp': (100, 60)}``. Other types aren't limited. """
+
+	CLIENT_RATE_LIMIT = None
+	""" The maximum number of requests each client can make per period in seconds, like ``(60, 60)``. ``None`` means there's no limit. """
+
+	CLIENT_NUM_PROXIES = 0
+	""" The number of trusted proxies in front of the server, used to find the client's address in the ``X-Forwarded-For`` header. """
+
+	THROTTLE_CACHE = 'default'
+	""" The alias of the cache which stores the rate limits and counts of dropped reports. """
+
+	JSON_BACKEND = 'stdlib'
+	""" The library used to decode and encode JSON: ``'stdlib'``, ``'orjson'``, ``'ujson'``, or ``'auto'`` to use the fastest one installed. """
+
+	BATCH_SIZE = 500
+	""" The maximum number of reports inserted per query when saving a batch of reports. ``None`` inserts them all at once. """
+
 
 	def ready (self):
 		""" Updates the AppConfig with values from the project settings. """
@@ -28,6 +121,9 @@ class DjangoLookoutConfig(AppConfig):
 		def show_checks (app_configs, **kwargs):
 			return checks
 
+		from .fields import check_json_columns
+		register_check(check_json_columns, Tags.database)
+
 		# Look for a settings dictionary
 		try:
 			settings = getattr(project_settings, self.name.upper())
@@ -56,3 +152,28 @@ class DjangoLookoutConfig(AppConfig):
 						hint="The key must be all-caps and have an equivalent default setting.",
 						obj=self
 					))
+
+		# Compile the report schemas with the chosen engine
+		from .report_schemas import report_schema_registry
+
+		try:
+			report_schema_registry.set_engine(self.SCHEMA_ENGINE)
+		except ValueError as e:
+			raise ImproperlyConfigured("Invalid 'SCHEMA_ENGINE' setting: {}".format(e))
+
+		report_schema_registry.shape_cache.max_size = self.SCHEMA_CACHE_SIZE
+		report_schema_registry.adaptive = self.ADAPTIVE_SCHEMA_ORDER
+		report_schema_registry.reorder_interval = self.SCHEMA_REORDER_INTERVAL
+
+		for name in ('ROLLUP_PERIODS', 'ROLLUP_RETENTION'):
+			unknown_periods = set(getattr(self, name)) - {'minute', 'hour', 'day'}
+			if unknown_periods:
+				raise ImproperlyConfigured("Invalid {!r} setting: unknown periods {}".format(name, ', '.join(sorted(unknown_periods))))
+
+		# Make sure the JSON backend is available
+		from .utils import get_json_backend
+
+		try:
+			get_json_backend(self.JSON_BACKEND)
+		except (ValueError, ImportError) as e:
+			raise ImproperlyConfigured("Invalid 'JSON_BACKEND' setting: {}".format(e))
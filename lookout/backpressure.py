@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+
+from django.apps import apps
+
+from . import buffer
+
+
+__all__ = ['IngestMonitor', 'ingest_monitor']
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class IngestMonitor:
+	""" Keeps track of how busy the database is with saving reports, so that new reports can be turned away when it's overloaded. """
+
+	smoothing = 0.2
+	""" Weight given to the newest sample in the moving average of write latency. """
+
+
+	def __init__ (self):
+		self.in_flight = 0
+		self.write_latency = None
+		self.last_write_time = None
+
+		self._lock = threading.Lock()
+
+
+	@contextmanager
+	def writing (self):
+		""" Context manager which wraps every write of reports to the database. """
+
+		with self._lock:
+			self.in_flight += 1
+
+		start = time.monotonic()
+
+		try:
+			yield
+		finally:
+			end = time.monotonic()
+
+			with self._lock:
+				self.in_flight -= 1
+
+				# Exponentially-weighted moving average
+				if self.write_latency is None:
+					self.write_latency = end - start
+				else:
+					self.write_latency += self.smoothing * (end - start - self.write_latency)
+
+				self.last_write_time = end
+
+
+	def is_saturated (self) -> bool:
+		""" Whether new reports should be rejected until the pipeline catches up. """
+
+		config = apps.get_app_config('lookout')
+
+		# Too many requests waiting on the database
+		if config.MAX_IN_FLIGHT_WRITES is not None and self.in_flight >= config.MAX_IN_FLIGHT_WRITES:
+			logger.warning("Too many reports are being saved at once ({}).".format(self.in_flight))
+			return True
+
+		# Writes have been slow recently. Stale measurements are ignored, or else nothing would be written to update them.
+		if (
+			config.MAX_WRITE_LATENCY is not None
+			and self.write_latency is not None
+			and time.monotonic() - self.last_write_time < config.RETRY_AFTER
+			and self.write_latency >= config.MAX_WRITE_LATENCY
+		):
+			logger.warning("Saving reports is too slow ({:.3f}s).".format(self.write_latency))
+			return True
+
+		# The write-behind buffer is nearly full
+		if config.BUFFER_REPORTS:
+			report_queue = buffer.get_report_buffer().queue
+
+			if report_queue.maxsize > 0 and report_queue.qsize() >= report_queue.maxsize * config.BUFFER_HIGH_WATER_MARK:
+				logger.warning("Report buffer is nearly full ({}).".format(report_queue.qsize()))
+				return True
+
+		return False
+
+
+
+ingest_monitor = IngestMonitor()
@@ -0,0 +1,165 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+import typing
+
+from django.apps import apps
+from django.db import close_old_connections
+
+
+__all__ = ['ReportBuffer', 'get_report_buffer']
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class ReportBuffer:
+	"""
+	Bounded in-process queue of unsaved reports which are written to the database in batches.
+
+	A background thread saves the queued reports whenever ``batch_size`` of them are waiting, or ``flush_interval`` seconds after the oldest one was queued.
+	"""
+
+	def __init__ (self, max_size: int = 10000, batch_size: typing.Optional[int] = 500, flush_interval: float = 1.0):
+		self.queue = queue.Queue(maxsize=max_size)
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+
+		self._thread = None
+		self._stopping = threading.Event()
+		self._lock = threading.Lock()
+
+
+	def put (self, reports: typing.Iterable) -> list:
+		""" Queues reports to be saved. Returns the reports which didn't fit in the queue. """
+
+		reports = list(reports)
+
+		for index, report in enumerate(reports):
+			try:
+				self.queue.put_nowait(report)
+			except queue.Full:
+				logger.warning("Report buffer is full.")
+				return reports[index:]
+
+		return []
+
+
+	def start (self):
+		""" Starts the background thread which saves queued reports. """
+
+		with self._lock:
+			if self._thread is not None:
+				return
+
+			self._stopping.clear()
+			self._thread = threading.Thread(target=self._run, name='lookout-report-buffer', daemon=True)
+			self._thread.start()
+
+		# Don't lose queued reports when the process exits
+		atexit.register(self.stop)
+
+
+	def stop (self):
+		""" Stops the background thread and saves everything that's still queued. """
+
+		with self._lock:
+			thread, self._thread = self._thread, None
+
+		if thread is not None:
+			self._stopping.set()
+			thread.join()
+
+		self.flush()
+
+
+	def flush (self):
+		""" Saves all of the queued reports in the calling thread. """
+
+		while True:
+			batch = self._take(block=False)
+			if not batch:
+				break
+			self._save(batch)
+
+
+	def _run (self):
+		""" Main loop of the background thread. """
+
+		while not self._stopping.is_set():
+			batch = self._take(block=True)
+			if batch:
+				self._save(batch)
+
+		# The thread is done with the database
+		close_old_connections()
+
+
+	def _take (self, block: bool) -> list:
+		""" Removes up to ``batch_size`` reports from the queue, optionally waiting for them to arrive. """
+
+		batch = []
+
+		try:
+			# Wait for the first report
+			batch.append(self.queue.get(block=block, timeout=self.flush_interval if block else None))
+		except queue.Empty:
+			return batch
+
+		deadline = time.monotonic() + self.flush_interval
+
+		while self.batch_size is None or len(batch) < self.batch_size:
+			timeout = deadline - time.monotonic()
+
+			try:
+				if block and timeout > 0:
+					batch.append(self.queue.get(timeout=timeout))
+				else:
+					batch.append(self.queue.get_nowait())
+			except queue.Empty:
+				break
+
+		return batch
+
+
+	def _save (self, batch: list):
+		""" Writes a batch of reports to the database. """
+
+		# Imported here to avoid a circular import
+		from .models import Report
+
+		close_old_connections()
+
+		try:
+			Report.objects.save_batch(batch, batch_size=self.batch_size)
+		except Exception:
+			logger.exception("Failed to save {} buffered reports.".format(len(batch)))
+		else:
+			logger.debug("Saved {} buffered reports.".format(len(batch)))
+
+
+
+_report_buffer = None
+_report_buffer_lock = threading.Lock()
+
+
+def get_report_buffer () -> ReportBuffer:
+	""" Returns the process-wide ``ReportBuffer``, creating and starting it on first use. """
+
+	global _report_buffer
+
+	with _report_buffer_lock:
+		if _report_buffer is None:
+			config = apps.get_app_config('lookout')
+
+			_report_buffer = ReportBuffer(
+				max_size=config.BUFFER_MAX_SIZE,
+				batch_size=config.BATCH_SIZE,
+				flush_interval=config.BUFFER_FLUSH_INTERVAL
+			)
+			_report_buffer.start()
+
+	return _report_buffer
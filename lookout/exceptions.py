@@ -1,7 +1,7 @@
 from json import JSONDecodeError  # Inherit so it can be imported from this module
 
 
-__all__ = ['UnknownSchemaError', 'JSONDecodeError']
+__all__ = ['UnknownSchemaError', 'RequestTooLargeError', 'ContentEncodingError', 'UnsupportedContentEncodingError', 'JSONDecodeError']
 
 
 
@@ -9,3 +9,24 @@ class UnknownSchemaError (Exception):
 	""" Raised when a report doesn't match any of the known schemas. """
 
 	msg = "The supplied JSON data doesn't match any known report schema."
+
+
+
+class RequestTooLargeError (Exception):
+	""" Raised when a request body exceeds the configured size or number of reports. """
+
+	msg = "The request is too large."
+
+
+
+class ContentEncodingError (Exception):
+	""" Raised when a compressed request body can't be decompressed. """
+
+	msg = "The request body couldn't be decompressed."
+
+
+
+class UnsupportedContentEncodingError (ContentEncodingError):
+	""" Raised when a request body is compressed with an unsupported algorithm. """
+
+	msg = "The request body's content encoding isn't supported."
@@ -0,0 +1,145 @@
+"""
+Model fields used by Django Lookout.
+
+``ReportBodyField`` stores reports in a native JSON column, if the version of Django supports it (3.1 or later).
+Otherwise, they're stored as JSON text and decoded when they're loaded.
+
+Databases migrated with an older version of Django keep their text columns after upgrading, until ``convert_json_columns`` is run.
+"""
+
+from django.apps import apps
+from django.core.checks import Warning
+from django.db import connections, models
+
+from .utils import json_loads, json_dumps
+
+
+__all__ = ['ReportBodyField', 'NATIVE_JSON_FIELD', 'text_json_columns', 'convert_json_columns', 'create_body_index', 'check_json_columns']
+
+
+NATIVE_JSON_FIELD = hasattr(models, 'JSONField')
+""" Whether ``ReportBodyField`` uses Django's native ``JSONField``. """
+
+JSON_COLUMN_TYPES = {'postgresql': 'jsonb', 'mysql': 'json'}
+""" The type of native JSON columns on each database which has them. Django's ``JSONField`` stores text on the others. """
+
+
+
+class TextJSONField (models.TextField):
+	"""
+	Stores JSON-compatible values as text, for versions of Django without ``JSONField``.
+
+	Lookups compare against the raw JSON text, so ``body__contains`` finds substrings.
+	"""
+
+	def from_db_value (self, value, expression, connection, *args):
+		if value is None:
+			return value
+
+		return json_loads(value)
+
+
+	def to_python (self, value):
+		if isinstance(value, str):
+			return json_loads(value)
+
+		return value
+
+
+	def get_prep_value (self, value):
+		# Strings are left as they are, so that they can be used in lookups
+		if value is None or isinstance(value, str):
+			return value
+
+		return json_dumps(value)
+
+
+	def value_to_string (self, obj):
+		return json_dumps(self.value_from_object(obj))
+
+
+
+class ReportBodyField (models.JSONField if NATIVE_JSON_FIELD else TextJSONField):
+	""" The decoded contents of a report. """
+
+
+
+def text_json_columns (connection) -> list:
+	""" Returns the ``(table, column)`` of each ``ReportBodyField`` which is stored as text, although it should be in a native JSON column. """
+
+	native_type = JSON_COLUMN_TYPES.get(connection.vendor)
+
+	# MariaDB's JSON type is an alias for text
+	if not NATIVE_JSON_FIELD or native_type is None or getattr(connection, 'mysql_is_mariadb', False):
+		return []
+
+	schema = 'current_schema()' if connection.vendor == 'postgresql' else 'DATABASE()'
+	columns = []
+
+	with connection.cursor() as cursor:
+		for model in apps.get_app_config('lookout').get_models():
+			for field in model._meta.local_fields:
+				if not isinstance(field, ReportBodyField):
+					continue
+
+				cursor.execute(
+					'SELECT data_type FROM information_schema.columns WHERE table_schema = {} AND table_name = %s AND column_name = %s'.format(schema),
+					[model._meta.db_table, field.column]
+				)
+				row = cursor.fetchone()
+
+				if row is not None and row[0].lower() != native_type:
+					columns.append((model._meta.db_table, field.column))
+
+	return columns
+
+
+def convert_json_columns (connection) -> list:
+	""" Converts the columns found by ``text_json_columns`` to native JSON columns, returning their ``(table, column)``. """
+
+	columns = text_json_columns(connection)
+	quote_name = connection.ops.quote_name
+
+	with connection.cursor() as cursor:
+		for table, column in columns:
+			if connection.vendor == 'postgresql':
+				cursor.execute('ALTER TABLE {0} ALTER COLUMN {1} TYPE jsonb USING {1}::jsonb'.format(quote_name(table), quote_name(column)))
+			else:
+				cursor.execute('ALTER TABLE {} MODIFY {} json NOT NULL'.format(quote_name(table), quote_name(column)))
+
+	return columns
+
+
+def create_body_index (connection) -> bool:
+	"""
+	Gives report bodies a GIN index on PostgreSQL if the ``BODY_INDEX`` setting is enabled, returning whether it was created.
+	It serves ``body__contains``, ``body__has_key``, ``body__has_keys``, and ``body__has_any_keys`` lookups, but not comparisons of single keys.
+	The index is built concurrently, so this can't be run in a transaction.
+	"""
+
+	if not apps.get_app_config('lookout').BODY_INDEX:
+		return False
+
+	if connection.vendor != 'postgresql' or not NATIVE_JSON_FIELD or ('lookout_report', 'body') in text_json_columns(connection):
+		return False
+
+	with connection.cursor() as cursor:
+		cursor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS lookout_report_body_gin ON lookout_report USING gin (body)')
+
+	return True
+
+
+def check_json_columns (app_configs, databases=None, **kwargs) -> list:
+	""" Warns about report bodies which are stored as text, when the database was migrated with a version of Django older than 3.1. """
+
+	warnings = []
+
+	for alias in databases or []:
+		for table, column in text_json_columns(connections[alias]):
+			warnings.append(Warning(
+				"The {}.{} column in the {!r} database stores JSON as text.".format(table, column, alias),
+				hint="Run 'manage.py lookout_convert_json --database {}' to convert it to a native JSON column.".format(alias),
+				obj=apps.get_app_config('lookout')
+			))
+
+	return warnings
@@ -0,0 +1,76 @@
+"""
+Standalone WSGI and ASGI applications for the report endpoint.
+
+They pass every request straight to the report view, skipping the project's URL routing and middleware,
+so they're suited to dedicated ingest workers. Point your server at a module like:
+
+.. code:: python
+
+	import os
+
+	os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+	from lookout.ingest import get_wsgi_application
+
+	application = get_wsgi_application()
+"""
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+
+try:
+	from django.core.handlers.asgi import ASGIHandler
+except ImportError:  # Django < 3.0
+	ASGIHandler = None
+
+
+__all__ = ['IngestWSGIHandler', 'IngestASGIHandler', 'get_wsgi_application', 'get_asgi_application']
+
+
+
+class IngestWSGIHandler (WSGIHandler):
+	""" WSGI application which handles every request with ``ReportView``. """
+
+	def load_middleware (self, is_async: bool = False):
+		from .views import ReportView
+
+		self._middleware_chain = convert_exception_to_response(ReportView.as_view())
+
+
+
+if ASGIHandler is not None:
+	class IngestASGIHandler (ASGIHandler):
+		""" ASGI application which handles every request with ``AsyncReportView``, or ``ReportView`` before Django 4.1. """
+
+		def load_middleware (self, is_async: bool = False):
+			from .views import ReportView, AsyncReportView
+
+			handler = AsyncReportView.as_view() if django.VERSION >= (4, 1) else ReportView.as_view()
+
+			# Django 3.0 runs the handler synchronously
+			if is_async:
+				handler = self.adapt_method_mode(is_async, handler)
+
+			self._middleware_chain = convert_exception_to_response(handler)
+else:
+	IngestASGIHandler = None
+
+
+
+def get_wsgi_application () -> IngestWSGIHandler:
+	""" Sets up Django and returns the WSGI ingest application, like ``django.core.wsgi.get_wsgi_application()``. """
+
+	django.setup(set_prefix=False)
+	return IngestWSGIHandler()
+
+
+def get_asgi_application () -> 'IngestASGIHandler':
+	""" Sets up Django and returns the ASGI ingest application. Requires Django 3.0 or later. """
+
+	if IngestASGIHandler is None:
+		raise ImproperlyConfigured("The ASGI ingest application requires Django 3.0 or later.")
+
+	django.setup(set_prefix=False)
+	return IngestASGIHandler()
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import Report
+
+
+
+class Command (BaseCommand):
+	help = "Fills in the columns which are copied from the bodies of reports, for reports saved before they existed."
+
+
+	def add_arguments (self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help="The number of reports updated in each transaction.")
+		parser.add_argument('--type', dest='types', action='append', help="Only update reports of this type. Can be used more than once.")
+
+
+	def handle (self, *args, batch_size: int = 1000, types=None, **options):
+		queryset = Report.objects.order_by('pk').only('pk', 'type', 'body', *Report.extracted_fields)
+
+		if types:
+			queryset = queryset.filter(type__in=types)
+
+		checked = updated = 0
+		last_pk = None
+
+		# Walk the table by primary key, so that each batch is found with the index rather than an offset
+		while True:
+			batch = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+			batch = list(batch[:batch_size])
+
+			if not batch:
+				break
+
+			with transaction.atomic():
+				for report in batch:
+					if report.extract_fields():
+						report.save(update_fields=Report.extracted_fields)
+						updated += 1
+
+			checked += len(batch)
+			last_pk = batch[-1].pk
+
+			if options['verbosity'] > 1:
+				self.stdout.write("Checked {} reports".format(checked))
+
+		self.stdout.write("Updated {} of {} reports.".format(updated, checked))
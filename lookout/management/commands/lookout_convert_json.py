@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from ...fields import NATIVE_JSON_FIELD, convert_json_columns, create_body_index
+
+
+
+class Command (BaseCommand):
+	help = (
+		"Converts report bodies which are stored as text to native JSON columns, when the database was migrated with a version of Django older than 3.1. "
+		"The tables are locked while they're converted. "
+		"The report bodies' GIN index is then created if the BODY_INDEX setting is enabled."
+	)
+
+
+	def add_arguments (self, parser):
+		parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="The database to convert.")
+
+
+	def handle (self, *args, database: str = DEFAULT_DB_ALIAS, **options):
+		if not NATIVE_JSON_FIELD:
+			raise CommandError("Native JSON columns need Django 3.1 or later.")
+
+		connection = connections[database]
+		columns = convert_json_columns(connection)
+
+		if not columns:
+			self.stdout.write("Report bodies are already stored in native JSON columns.")
+
+		for table, column in columns:
+			self.stdout.write("Converted {}.{}.".format(table, column))
+
+		if create_body_index(connection):
+			self.stdout.write("Indexed lookout_report.body.")
@@ -0,0 +1,175 @@
+import re
+import typing
+
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import dateparse
+
+from ...models import Report
+from ...utils import truncate_time
+
+
+PERIODS = ('day', 'week', 'month')
+
+BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+
+def next_period (start: datetime, period: str) -> datetime:
+	""" Returns the start of the period after the one starting at ``start``. """
+
+	if period == 'week':
+		return start + timedelta(weeks=1)
+	elif period == 'month':
+		return (start + timedelta(days=32)).replace(day=1)
+
+	return start + timedelta(days=1)
+
+
+
+class Command (BaseCommand):
+	help = (
+		"Partitions the reports table by submission time on PostgreSQL, creating partitions for upcoming periods and dropping expired ones. "
+		"Run it regularly, like from a daily cron job."
+	)
+
+
+	def add_arguments (self, parser):
+		parser.add_argument('--period', choices=PERIODS, default='month', help="The length of time covered by each new partition.")
+		parser.add_argument('--ahead', type=int, default=3, help="The number of upcoming periods to create partitions for.")
+		parser.add_argument('--retention', type=int, help="Drop partitions which only contain reports submitted more than this many days ago.")
+		parser.add_argument('--convert', action='store_true', help="Convert an existing table into a partitioned one, copying every report. The table is locked until it's done.")
+		parser.add_argument('--dry-run', action='store_true', help="Print the SQL statements instead of running them.")
+		parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="The database to partition.")
+
+
+	def handle (self, *args, period: str = 'month', ahead: int = 3, retention: typing.Optional[int] = None, convert: bool = False, dry_run: bool = False, database: str = DEFAULT_DB_ALIAS, **options):
+		connection = connections[database]
+
+		if connection.vendor != 'postgresql':
+			raise CommandError("Partitioning is only supported on PostgreSQL, not {}.".format(connection.vendor))
+
+		table = Report._meta.db_table
+		now = datetime.now(timezone.utc)
+
+		with connection.cursor() as cursor:
+			before, after = [], []
+
+			if self.is_partitioned(cursor, table):
+				partitions = self.get_partitions(cursor, table)
+				start = truncate_time(now, period)
+			elif convert:
+				partitions = {}
+				before, after = self.convert_sql(cursor, table)
+
+				# Cover every existing report
+				cursor.execute('SELECT MIN(created_time) FROM {}'.format(table))
+				oldest, = cursor.fetchone()
+				start = truncate_time(min(oldest or now, now), period)
+
+				# Holds any reports submitted after the last partition
+				after.insert(0, 'CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(table))
+			else:
+				raise CommandError("The {} table isn't partitioned. Use --convert to convert it.".format(table))
+
+			# Create partitions from the start of the current period, or the oldest report
+			end = truncate_time(now, period)
+			for _ in range(ahead + 1):
+				end = next_period(end, period)
+
+			statements = before
+
+			while start < end:
+				name = '{}_p{:%Y%m%d}'.format(table, start)
+				upper = next_period(start, period)
+
+				if name not in partitions:
+					statements.append(self.create_partition_sql(table, name, start, upper))
+
+				start = upper
+
+			statements.extend(after)
+
+			# Drop the partitions whose reports have all expired
+			if retention is not None:
+				expiry = now - timedelta(days=retention)
+
+				for name, (lower, upper) in sorted(partitions.items()):
+					if upper is not None and upper <= expiry:
+						statements.append('DROP TABLE {}'.format(name))
+
+			if dry_run:
+				for statement in statements:
+					self.stdout.write(statement + ';')
+				return
+
+			with transaction.atomic(using=database):
+				for statement in statements:
+					if options['verbosity'] > 1:
+						self.stdout.write(statement)
+
+					cursor.execute(statement)
+
+		self.stdout.write("Ran {} statements.".format(len(statements)))
+
+
+	@staticmethod
+	def is_partitioned (cursor, table: str) -> bool:
+		cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [table])
+		return cursor.fetchone() is not None
+
+
+	@staticmethod
+	def get_partitions (cursor, table: str) -> typing.Dict[str, typing.Tuple[typing.Optional[datetime], typing.Optional[datetime]]]:
+		""" Returns the name of each of the table's partitions, mapped to the range of submission times it holds. The default partition's range is ``(None, None)``. """
+
+		cursor.execute(
+			'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits '
+			'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+			'WHERE pg_inherits.inhparent = %s::regclass',
+			[table]
+		)
+
+		partitions = {}
+		for name, bound in cursor.fetchall():
+			match = BOUNDS.search(bound)
+			partitions[name] = tuple(dateparse.parse_datetime(value) for value in match.groups()) if match else (None, None)
+
+		return partitions
+
+
+	@staticmethod
+	def create_partition_sql (table: str, name: str, lower: datetime, upper: datetime) -> str:
+		return "CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{:%Y-%m-%d %H:%M:%S}+00') TO ('{:%Y-%m-%d %H:%M:%S}+00')".format(name, table, lower, upper)
+
+
+	@staticmethod
+	def convert_sql (cursor, table: str) -> typing.Tuple[list, list]:
+		"""
+		Returns the statements which replace a table with a partitioned copy, to be run before and after its partitions are created.
+
+		Partitioned tables need the partition key in their primary key, so it becomes ``(uuid, created_time)``.
+		The other indexes and foreign keys are recreated from their current definitions once the old table is dropped.
+		"""
+
+		cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)', [table, table])
+		indexes = [indexdef for indexdef, in cursor.fetchall()]
+
+		cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [table])
+		foreign_keys = ['ALTER TABLE {} ADD CONSTRAINT {} {}'.format(table, name, definition) for name, definition in cursor.fetchall()]
+
+		before = [
+			'LOCK TABLE {} IN EXCLUSIVE MODE'.format(table),
+			'ALTER TABLE {0} RENAME TO {0}_unpartitioned'.format(table),
+			'CREATE TABLE {0} (LIKE {0}_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (created_time)'.format(table),
+			'ALTER TABLE {} ADD PRIMARY KEY (uuid, created_time)'.format(table)
+		]
+
+		after = [
+			'INSERT INTO {0} SELECT * FROM {0}_unpartitioned'.format(table),
+			'DROP TABLE {}_unpartitioned'.format(table)
+		] + indexes + foreign_keys
+
+		return before, after
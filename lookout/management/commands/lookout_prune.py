@@ -0,0 +1,116 @@
+import time
+
+from datetime import datetime, timedelta, timezone
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from ...models import Report, rollup_models
+
+
+
+class Command (BaseCommand):
+	help = "Deletes the reports and rollups which are older than the number of days in the RETENTION and ROLLUP_RETENTION settings for their type or period."
+
+
+	def add_arguments (self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help="The number of reports deleted in each transaction.")
+		parser.add_argument('--sleep', type=float, default=0.1, help="The number of seconds to wait between batches, so that other queries aren't held up.")
+		parser.add_argument('--type', dest='types', action='append', help="Only delete reports of this type. Can be used more than once.")
+		parser.add_argument('--period', dest='periods', choices=list(rollup_models), action='append', help="Only delete rollups for this period. Can be used more than once.")
+		parser.add_argument('--dry-run', action='store_true', help="Count the reports and rollups which would be deleted instead of deleting them.")
+
+
+	def handle (self, *args, batch_size: int = 1000, sleep: float = 0.1, types=None, periods=None, dry_run: bool = False, **options):
+		config = apps.get_app_config('lookout')
+		retention = config.RETENTION
+		rollup_retention = config.ROLLUP_RETENTION
+
+		if types or periods:
+			types = types or []
+			periods = periods or []
+
+			unknown = [report_type for report_type in types if report_type not in retention] + [period for period in periods if period not in rollup_retention]
+
+			if unknown:
+				raise CommandError("There's no retention period for {}.".format(', '.join(unknown)))
+		else:
+			types = sorted(retention)
+			periods = sorted(rollup_retention)
+
+		now = datetime.now(timezone.utc)
+
+		for report_type in types:
+			expired = Report.objects.filter(type=report_type, created_time__lt=now - timedelta(days=retention[report_type]))
+
+			if dry_run:
+				self.stdout.write("Would delete {} {} reports.".format(expired.count(), report_type))
+			else:
+				self.stdout.write("Deleted {} {} reports.".format(self.delete(expired, batch_size, sleep), report_type))
+
+		for period in periods:
+			expired = rollup_models[period].objects.filter(period_start__lt=now - timedelta(days=rollup_retention[period]))
+
+			if dry_run:
+				self.stdout.write("Would delete {} {} rollups.".format(expired.count(), period))
+			else:
+				self.stdout.write("Deleted {} {} rollups.".format(self.delete_rollups(expired, batch_size, sleep), period))
+
+
+	def delete (self, queryset, batch_size: int, sleep: float) -> int:
+		""" Deletes the reports in batches, oldest first, returning how many were deleted. """
+
+		queryset = queryset.order_by('created_time')
+		deleted = 0
+		last_time = None
+		last_pks = []
+
+		while True:
+			# Carry on from the last batch with a range on the (type, created_time) index, rather than scanning it past the rows it deleted
+			batch = queryset.filter(created_time__gte=last_time).exclude(pk__in=last_pks) if last_time else queryset
+			batch = list(batch.values_list('created_time', 'pk')[:batch_size])
+
+			if not batch:
+				return deleted
+
+			with transaction.atomic():
+				count, _ = Report.objects.filter(pk__in=[pk for _, pk in batch]).delete()
+
+			deleted += count
+			last_time = batch[-1][0]
+			# Reports submitted at the same time as the last one are found again by the next batch's range, unless they're skipped
+			last_pks = [pk for created_time, pk in batch if created_time == last_time]
+
+			if len(batch) < batch_size:
+				return deleted
+
+			time.sleep(sleep)
+
+
+	def delete_rollups (self, queryset, batch_size: int, sleep: float) -> int:
+		""" Deletes the rollups in batches, oldest first, returning how many were deleted. """
+
+		queryset = queryset.order_by('period_start', 'pk')
+		deleted = 0
+		last = None
+
+		while True:
+			# Carry on from the last batch with a range on the period_start index. Rollups which were backfilled later can have any primary key.
+			batch = queryset.filter(Q(period_start__gt=last[0]) | Q(period_start=last[0], pk__gt=last[1])) if last else queryset
+			batch = list(batch.values_list('period_start', 'pk')[:batch_size])
+
+			if not batch:
+				return deleted
+
+			with transaction.atomic():
+				count, _ = queryset.model.objects.filter(pk__in=[pk for _, pk in batch]).delete()
+
+			deleted += count
+			last = batch[-1]
+
+			if len(batch) < batch_size:
+				return deleted
+
+			time.sleep(sleep)
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction, IntegrityError
+from django.db.models import Count, DateTimeField, Max, Min
+from django.db.models.functions import Trunc
+
+from ...models import Report, rollup_models
+from ...utils import chunked, truncate_time
+
+
+
+class Command (BaseCommand):
+	help = (
+		"Recounts the rollups of the last few days from the stored reports, raising their counts to the number of reports. "
+		"Use it to fill in rollups for reports saved without ROLLUP_PERIODS, rather than alongside it."
+	)
+
+
+	def add_arguments (self, parser):
+		parser.add_argument('--period', dest='periods', choices=list(rollup_models), action='append', help="Only recount the rollups for this period. Can be used more than once.")
+		parser.add_argument('--days', type=int, default=1, help="The number of days to recount, including today.")
+		parser.add_argument('--batch-size', type=int, default=1000, help="The number of rollups inserted per query.")
+
+
+	def handle (self, *args, periods=None, days: int = 1, batch_size: int = 1000, **options):
+		if apps.get_app_config('lookout').AGGREGATE_REPORTS:
+			raise CommandError("Reports aren't stored individually while AGGREGATE_REPORTS is enabled, so they can't be recounted.")
+
+		if not periods:
+			periods = list(rollup_models)
+
+		end = truncate_time(datetime.now(timezone.utc), 'day') + timedelta(days=1)
+		start = end - timedelta(days=days)
+
+		counts = dict.fromkeys(periods, 0)
+
+		# Recount one day at a time, so that each transaction is short
+		while start < end:
+			for period in periods:
+				with transaction.atomic():
+					counts[period] += self.recount(rollup_models[period], start, start + timedelta(days=1), batch_size)
+
+			start += timedelta(days=1)
+
+		for period in periods:
+			self.stdout.write("Counted {} {} rollups.".format(counts[period], period))
+
+
+	@staticmethod
+	def recount (model, start: datetime, end: datetime, batch_size: int) -> int:
+		"""
+		Counts the stored reports in the periods between ``start`` and ``end``, returning the number of rollups counted.
+
+		Existing rollups are only ever raised to the number of stored reports, so the counts of reports which were aggregated or have been deleted are kept.
+		"""
+
+		groups = (
+			Report.objects.filter(incident_time__gte=start, incident_time__lt=end)
+			.annotate(period_start=Trunc('incident_time', model.period, output_field=DateTimeField(), tzinfo=timezone.utc))
+			.order_by()
+			.values('period_start', 'type', *Report.extracted_fields)
+			.annotate(count=Count('pk'), first_seen=Min('incident_time'), last_seen=Max('incident_time'))
+		)
+
+		rollups = sorted((
+			model(key=model.get_key(group['period_start'], group['type'], *(group[name] for name in Report.extracted_fields)), **group)
+			for group in groups
+		), key=lambda rollup: rollup.key)
+
+		for batch in chunked(rollups, batch_size):
+			# Update rows in a consistent order, so concurrent writers don't deadlock
+			missing = [rollup for rollup in batch if not model.objects.raise_count(rollup)]
+
+			try:
+				with transaction.atomic():
+					model.objects.bulk_create(missing)
+			except IntegrityError:
+				# Another writer counted reports into some of them first
+				for rollup in missing:
+					rollup.pk = None
+
+					try:
+						with transaction.atomic():
+							rollup.save(force_insert=True)
+					except IntegrityError:
+						model.objects.raise_count(rollup)
+
+		return len(rollups)
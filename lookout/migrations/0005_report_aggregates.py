@@ -0,0 +1,44 @@
+from django.db.migrations import Migration as BaseMigration, AddField, CreateModel
+from django.db.models import AutoField, CharField, DateTimeField, PositiveIntegerField, TextField, URLField
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0003_url_optional'),
+	]
+
+
+	operations = [
+		AddField(
+			model_name='report',
+			name='fingerprint',
+			field=CharField(blank=True, db_index=True, editable=False, help_text='Identifies repeats of the same incident.', max_length=40)
+		),
+
+		CreateModel(
+			name='ReportAggregate',
+			fields=[
+				('id', AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+				('fingerprint', CharField(editable=False, help_text='Identifies repeats of the same incident.', max_length=40, unique=True)),
+				('type', CharField(
+					choices=[
+						('csp', 'Content Security Policy Report'),
+						('legacy_csp', 'Legacy Content Security Policy Report'),
+						('hpkp', 'HTTP Public Key Pinning Report'),
+						('legacy_hpkp', 'Legacy HTTP Public Key Pinning Report'),
+						('misc', 'Unknown Incident Report')
+					],
+					db_index=True, help_text="The reports' category.", max_length=120
+				)),
+				('url', URLField(help_text='The address of the document or worker from which the first report was generated.', null=True)),
+				('body', TextField(help_text='The contents of the first incident report.')),
+				('first_seen', DateTimeField(help_text='When the first incident occurred.')),
+				('last_seen', DateTimeField(db_index=True, help_text='When the latest incident occurred.')),
+				('count', PositiveIntegerField(default=0, help_text='The number of reports of the incident.'))
+			],
+			options={
+				'ordering': ['-last_seen']
+			}
+		)
+	]
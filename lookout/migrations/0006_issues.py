@@ -0,0 +1,43 @@
+from django.db.migrations import Migration as BaseMigration, AddField, CreateModel
+from django.db.models import AutoField, CharField, DateTimeField, ForeignKey, PositiveIntegerField, SET_NULL
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0005_report_aggregates'),
+	]
+
+
+	operations = [
+		CreateModel(
+			name='Issue',
+			fields=[
+				('id', AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+				('key', CharField(editable=False, help_text='Identifies the reports of the issue.', max_length=40, unique=True)),
+				('type', CharField(
+					choices=[
+						('csp', 'Content Security Policy Report'),
+						('legacy_csp', 'Legacy Content Security Policy Report'),
+						('hpkp', 'HTTP Public Key Pinning Report'),
+						('legacy_hpkp', 'Legacy HTTP Public Key Pinning Report'),
+						('misc', 'Unknown Incident Report')
+					],
+					db_index=True, help_text="The reports' category.", max_length=120
+				)),
+				('title', CharField(help_text='Summarizes the issue.', max_length=255)),
+				('first_seen', DateTimeField(db_index=True, help_text='When the issue was first reported.')),
+				('last_seen', DateTimeField(db_index=True, help_text='When the issue was last reported.')),
+				('count', PositiveIntegerField(default=0, help_text='The number of reports of the issue.'))
+			],
+			options={
+				'ordering': ['-last_seen']
+			}
+		),
+
+		AddField(
+			model_name='report',
+			name='issue',
+			field=ForeignKey(blank=True, editable=False, help_text='The issue the report belongs to.', null=True, on_delete=SET_NULL, related_name='reports', to='lookout.Issue')
+		)
+	]
@@ -0,0 +1,111 @@
+import json
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.migrations import Migration as BaseMigration, RunPython, AddField, AlterField, RemoveField, RenameField
+from django.db.models import TextField
+
+from lookout.fields import ReportBodyField, NATIVE_JSON_FIELD
+
+
+CHUNK_SIZE = 1000
+""" The number of reports converted per transaction, so that large tables aren't locked for the whole migration. """
+
+
+
+def convert_chunks (apps, schema_editor, from_field, to_field, convert):
+	""" Copies each report's body between fields in chunks, ordered by primary key. """
+
+	db_alias = schema_editor.connection.alias
+	Report = apps.get_model('lookout', 'Report')
+
+	last_pk = None
+
+	while True:
+		queryset = Report.objects.using(db_alias).order_by('pk')
+		if last_pk is not None:
+			queryset = queryset.filter(pk__gt=last_pk)
+
+		chunk = list(queryset.values_list('pk', from_field)[:CHUNK_SIZE])
+		if not chunk:
+			break
+
+		with transaction.atomic(using=db_alias):
+			for pk, value in chunk:
+				Report.objects.using(db_alias).filter(pk=pk).update(**{to_field: convert(value)})
+
+		last_pk = chunk[-1][0]
+
+
+def text_to_json (apps, schema_editor):
+	convert_chunks(apps, schema_editor, 'body', 'body_json', json.loads)
+
+
+def json_to_text (apps, schema_editor):
+	convert_chunks(apps, schema_editor, 'body_json', 'body', json.dumps)
+
+
+def create_gin_index (apps, schema_editor):
+	""" Indexes the contents of report bodies on PostgreSQL if the ``BODY_INDEX`` setting is enabled, for ``body__contains`` and ``body__has_key`` lookups. """
+
+	if schema_editor.connection.vendor != 'postgresql' or not NATIVE_JSON_FIELD or not django_apps.get_app_config('lookout').BODY_INDEX:
+		return
+
+	schema_editor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS lookout_report_body_gin ON lookout_report USING gin (body)')
+
+
+def drop_gin_index (apps, schema_editor):
+	if schema_editor.connection.vendor != 'postgresql':
+		return
+
+	schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS lookout_report_body_gin')
+
+
+
+class Migration (BaseMigration):
+	# Each chunk is converted in its own transaction
+	atomic = False
+
+
+	dependencies = [
+		('lookout', '0006_issues'),
+	]
+
+
+	operations = [
+		# Convert the bodies into a new field, then replace the old one with it
+		AddField(
+			model_name='report',
+			name='body_json',
+			field=ReportBodyField(null=True)
+		),
+		AlterField(
+			model_name='report',
+			name='body',
+			field=TextField(null=True, help_text='The contents of the incident report.')
+		),
+		RunPython(text_to_json, json_to_text),
+		RemoveField(
+			model_name='report',
+			name='body'
+		),
+		RenameField(
+			model_name='report',
+			old_name='body_json',
+			new_name='body'
+		),
+		AlterField(
+			model_name='report',
+			name='body',
+			field=ReportBodyField(help_text='The contents of the incident report.')
+		),
+
+		# Aggregates are new, so there are few enough to convert at once
+		AlterField(
+			model_name='reportaggregate',
+			name='body',
+			field=ReportBodyField(help_text='The contents of the first incident report.')
+		),
+
+		RunPython(create_gin_index, drop_gin_index)
+	]
@@ -0,0 +1,39 @@
+from django.db.migrations import Migration as BaseMigration, AddField, AddIndex
+from django.db.models import CharField, Index
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0007_json_body'),
+	]
+
+
+	# Existing reports are filled in by the ``lookout_backfill`` command, rather than here, so that large tables aren't locked
+	operations = [
+		AddField(
+			model_name='report',
+			name='directive',
+			field=CharField(blank=True, editable=False, help_text='The violated CSP directive, without its value.', max_length=120)
+		),
+		AddField(
+			model_name='report',
+			name='blocked_origin',
+			field=CharField(blank=True, db_index=True, editable=False, help_text='The origin of the resource blocked by CSP.', max_length=255)
+		),
+		AddField(
+			model_name='report',
+			name='document_host',
+			field=CharField(blank=True, db_index=True, editable=False, help_text='The host of the document or worker from which the report was generated.', max_length=255)
+		),
+		AddField(
+			model_name='report',
+			name='hostname',
+			field=CharField(blank=True, db_index=True, editable=False, help_text='The host whose pinned keys failed validation.', max_length=255)
+		),
+
+		AddIndex(
+			model_name='report',
+			index=Index(fields=['type', 'directive', '-incident_time'], name='lookout_report_directive_idx')
+		)
+	]
@@ -0,0 +1,20 @@
+from django.db.migrations import Migration as BaseMigration, AlterField
+from django.db.models import DateTimeField
+from django.utils.timezone import now
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0008_report_extracted_fields'),
+	]
+
+
+	# Keep the submission time a report is built with, which its UUID may be derived from, rather than replacing it when it's saved
+	operations = [
+		AlterField(
+			model_name='report',
+			name='created_time',
+			field=DateTimeField(db_index=True, default=now, editable=False, help_text='When the incident report was submitted.', verbose_name='Submission Time')
+		)
+	]
@@ -0,0 +1,18 @@
+from django.db.migrations import Migration as BaseMigration, AddIndex
+from django.db.models import Index
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0009_created_time_default'),
+	]
+
+
+	# Finds the oldest reports of each type, for lookout_prune
+	operations = [
+		AddIndex(
+			model_name='report',
+			index=Index(fields=['type', 'created_time'], name='lookout_report_created_idx')
+		)
+	]
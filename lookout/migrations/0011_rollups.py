@@ -0,0 +1,52 @@
+from django.db.migrations import Migration as BaseMigration, CreateModel
+from django.db.models import AutoField, CharField, DateTimeField, Index, PositiveIntegerField
+
+
+
+def rollup_fields ():
+	""" Each model needs its own field instances. """
+
+	return [
+		('id', AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+		('key', CharField(editable=False, help_text='Identifies the period and the values counted.', max_length=40, unique=True)),
+		('period_start', DateTimeField(help_text='When the period started.')),
+		('type', CharField(
+			choices=[
+				('csp', 'Content Security Policy Report'),
+				('legacy_csp', 'Legacy Content Security Policy Report'),
+				('hpkp', 'HTTP Public Key Pinning Report'),
+				('legacy_hpkp', 'Legacy HTTP Public Key Pinning Report'),
+				('misc', 'Unknown Incident Report')
+			],
+			help_text="The reports' category.", max_length=120
+		)),
+		('directive', CharField(blank=True, help_text='The violated CSP directive, without its value.', max_length=120)),
+		('blocked_origin', CharField(blank=True, help_text='The origin of the resource blocked by CSP.', max_length=255)),
+		('document_host', CharField(blank=True, help_text='The host of the document or worker from which the reports were generated.', max_length=255)),
+		('hostname', CharField(blank=True, help_text='The host whose pinned keys failed validation.', max_length=255)),
+		('first_seen', DateTimeField(help_text='When the first incident in the period occurred.')),
+		('last_seen', DateTimeField(help_text='When the latest incident in the period occurred.')),
+		('count', PositiveIntegerField(default=0, help_text='The number of reports.'))
+	]
+
+
+def rollup_options (period: str) -> dict:
+	return {
+		'ordering': ['-period_start'],
+		'abstract': False,
+		'indexes': [Index(fields=['type', 'period_start'], name='lookout_{}rollup_type_idx'.format(period))]
+	}
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0010_report_type_created_time'),
+	]
+
+
+	operations = [
+		CreateModel(name='MinuteRollup', fields=rollup_fields(), options=rollup_options('minute')),
+		CreateModel(name='HourRollup', fields=rollup_fields(), options=rollup_options('hour')),
+		CreateModel(name='DayRollup', fields=rollup_fields(), options=rollup_options('day'))
+	]
@@ -0,0 +1,27 @@
+from django.db.migrations import Migration as BaseMigration, RunPython
+
+from lookout.fields import convert_json_columns, create_body_index
+
+
+
+def convert_to_native_json (apps, schema_editor):
+	""" Converts report bodies which are still stored as text, because the database was migrated with a version of Django older than 3.1. """
+
+	convert_json_columns(schema_editor.connection)
+	create_body_index(schema_editor.connection)
+
+
+
+class Migration (BaseMigration):
+	# The GIN index is built concurrently
+	atomic = False
+
+
+	dependencies = [
+		('lookout', '0011_rollups'),
+	]
+
+
+	operations = [
+		RunPython(convert_to_native_json, RunPython.noop)
+	]
@@ -0,0 +1,19 @@
+from django.db.migrations import Migration as BaseMigration, AddIndex
+from django.db.models import Index
+
+
+
+class Migration (BaseMigration):
+	dependencies = [
+		('lookout', '0012_native_json_body'),
+	]
+
+
+	# Finds the oldest rollups of every type, for lookout_prune
+	operations = [
+		AddIndex(
+			model_name=model_name,
+			index=Index(fields=['period_start'], name='lookout_{}_start_idx'.format(model_name))
+		)
+		for model_name in ['minuterollup', 'hourrollup', 'dayrollup']
+	]
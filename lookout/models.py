@@ -1,12 +1,14 @@
 import logging
 import typing
-import json
 import uuid
 
 from datetime import timedelta, datetime, timezone
 
-from django.db import models
-from django.utils import formats
+from django.apps import apps
+from django.db import models, router, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.functions import Greatest, Least
+from django.utils import formats, timezone as django_timezone
 from django.utils.safestring import mark_safe
 
 from pygments import highlight
@@ -14,77 +16,364 @@ from pygments.lexers.data import JsonLexer
 from pygments.formatters.html import HtmlFormatter
 
 from .report_schemas import ReportSchema, report_schema_registry
+from .backpressure import ingest_monitor
+from .throttling import report_throttle
+from .fields import ReportBodyField
+from .utils import json_loads, json_dumps, fingerprint, truncate_time, uuid7
 
 
 logger = logging.getLogger(__name__)
 
 
-__all__ = ['Report']
+__all__ = ['Report', 'ReportAggregate', 'Issue', 'MinuteRollup', 'HourRollup', 'DayRollup', 'rollup_models']
 
 
 
 class ReportManager (models.Manager):
 	""" Manager for the Report model. """
 
-	def create_from_json (self, report_json: typing.AnyStr) -> typing.Iterator[models.Model]:
-		""" Converts JSON data into a list of Report instances. """
+	def build_from_json (self, report_json: typing.Union[str, bytes], content_type: typing.Optional[str] = None) -> typing.Iterator[models.Model]:
+		"""
+		Converts JSON data into unsaved Report instances.
+
+		``content_type`` is the media type the reports were sent with, which is used as a hint about their schema.
+		"""
 
 		logger.debug("Decoding JSON")
-		report_datum = json.loads(report_json)
+		report_datum = json_loads(report_json)
 
 		# Wrap single reports in a list
 		if not isinstance(report_datum, list):
 			report_datum = [report_datum]
 
+		return self.build_from_data(report_datum, content_type=content_type)
+
+
+	def build_from_data (self, report_datum: typing.Iterable, content_type: typing.Optional[str] = None, throttle: bool = False) -> typing.Iterator[models.Model]:
+		"""
+		Converts decoded reports into unsaved Report instances, one at a time.
+
+		``throttle`` skips the reports dropped by the ``SAMPLE_RATES`` and ``RATE_LIMITS`` settings.
+		"""
+
+		time_ordered_uuids = apps.get_app_config('lookout').TIME_ORDERED_UUIDS
+
 		# Iterate over separate reports
 		for report_data in report_datum:
 			logger.debug("Attempt to determine the type of report by testing each schema.")
 
 			# Figure out what type of report it is
-			schema = report_schema_registry.get_matching_schema(report_data)
+			schema = report_schema_registry.get_matching_schema(report_data, content_type=content_type)
 
 			# Normalize to a generic schema
 			schema, report_data = schema.normalize(report_data)
 
+			if throttle and not report_throttle.allow(schema, report_data):
+				continue
+
 			# Use a static datetime object to make sure `created_time`, `incident_time`, and `body['age']` are consistent
 			now = datetime.now(timezone.utc)
 
 			# Build the model instance
-			yield self.create(
+			report = self.model(
+				uuid=uuid7(now) if time_ordered_uuids else uuid.uuid4(),
 				created_time=now,
 				# Use the report's `age` property to determine when the incident occurred
 				incident_time=now - timedelta(milliseconds=report_data.get('age', 0)),
 				type=schema.type,
 				url=report_data.get('url', None),
-				body=json.dumps(report_data)
+				body=report_data,
+				fingerprint=fingerprint((schema.type,) + tuple(schema.fingerprint_key(report_data)))
 			)
 
+			report.extract_fields(schema)
+
+			yield report
+
+
+	def create_from_json (self, report_json: typing.Union[str, bytes], content_type: typing.Optional[str] = None) -> typing.Iterator[models.Model]:
+		"""
+		Converts JSON data into a list of Report instances, saving each one as it's created.
+
+		Each report is saved with ``save_batch()``, so it's counted as an aggregate instead if ``AGGREGATE_REPORTS`` is enabled.
+		"""
+
+		for report in self.build_from_json(report_json, content_type=content_type):
+			self.save_batch([report])
+
+			yield report
+
+
+	def bulk_create_from_json (self, report_json: typing.Union[str, bytes], batch_size: typing.Optional[int] = None, content_type: typing.Optional[str] = None) -> typing.List[models.Model]:
+		"""
+		Converts JSON data into a list of Report instances and saves them all at once.
+
+		Every report is validated and normalized before anything is written, then the whole batch is inserted in a single transaction.
+		If any of the reports fail validation, none of them are saved.
+		"""
+
+		# Build everything first so that an invalid report aborts the batch before it reaches the database
+		reports = list(self.build_from_json(report_json, content_type=content_type))
+
+		return self.save_batch(reports, batch_size=batch_size)
+
+
+	def save_batch (self, reports: typing.List[models.Model], batch_size: typing.Optional[int] = None) -> typing.List[models.Model]:
+		"""
+		Inserts unsaved Report instances in a single transaction, linking them to their issues if ``GROUP_ISSUES`` is enabled.
+
+		If ``AGGREGATE_REPORTS`` is enabled, they're counted as ``ReportAggregate`` occurrences instead of being inserted.
+		They're also counted in the rollups for each of the ``ROLLUP_PERIODS``.
+		"""
+
+		config = apps.get_app_config('lookout')
+
+		if batch_size is None:
+			batch_size = config.BATCH_SIZE
+
+		with ingest_monitor.writing(), transaction.atomic(using=self.db):
+			if config.GROUP_ISSUES:
+				Issue.objects.db_manager(self.db).assign(reports)
+
+			self.record_rollups(reports)
+
+			if config.AGGREGATE_REPORTS:
+				ReportAggregate.objects.db_manager(self.db).record(reports)
+				return reports
+
+			return self.bulk_create(reports, batch_size=batch_size)
+
+
+	def record_rollups (self, reports: typing.List[models.Model]):
+		""" Counts unsaved Report instances in the rollups for each of the ``ROLLUP_PERIODS``. """
+
+		for period in apps.get_app_config('lookout').ROLLUP_PERIODS:
+			rollup_models[period].objects.db_manager(self.db).record(reports)
+
+
+	async def asave_batch (self, reports: typing.List[models.Model], batch_size: typing.Optional[int] = None) -> typing.List[models.Model]:
+		""" Async version of ``save_batch()``. Requires Django 3.0 or later. """
+
+		from asgiref.sync import sync_to_async
+
+		# Transactions can't span async code, so the whole batch is saved in a worker thread
+		return await sync_to_async(self.save_batch)(reports, batch_size=batch_size)
+
 
 report_types = [(schema.type, schema.name) for schema in report_schema_registry.values()]
 
 
+class OccurrenceManager (models.Manager):
+	"""
+	Base manager for models which count the occurrences of reports sharing a key.
+
+	Counts are incremented by the database, so concurrent writers don't lose any.
+	Each key's row is created by the first writer to see it, with later writers falling back to incrementing it.
+	"""
+
+	key_field = None
+	""" The name of the model's unique field which identifies the reports it counts. """
+
+
+	def get_key (self, report: models.Model) -> typing.Optional[str]:
+		""" Returns the key of an unsaved Report instance, or ``None`` if it shouldn't be counted. """
+		raise NotImplementedError()
+
+
+	def build (self, report: models.Model) -> models.Model:
+		""" Creates an unsaved instance for the first report with a key. """
+		raise NotImplementedError()
+
+
+	def record (self, reports: typing.Iterable[models.Model]) -> typing.Dict[str, models.Model]:
+		""" Counts unsaved Report instances as occurrences of their keys. Returns the occurrences counted for each key. """
+
+		occurrences = {}
+
+		for report in reports:
+			key = self.get_key(report)
+
+			if key is None:
+				continue
+
+			occurrence = occurrences.get(key)
+
+			if occurrence is None:
+				occurrence = occurrences[key] = self.build(report)
+				occurrence.first_seen = report.incident_time
+				occurrence.last_seen = report.incident_time
+				occurrence.count = 1
+			else:
+				occurrence.first_seen = min(occurrence.first_seen, report.incident_time)
+				occurrence.last_seen = max(occurrence.last_seen, report.incident_time)
+				occurrence.count += 1
+
+		with transaction.atomic(using=self.db):
+			# Update rows in a consistent order, so concurrent writers don't deadlock
+			for key in sorted(occurrences):
+				occurrence = occurrences[key]
+
+				if self.increment(occurrence):
+					continue
+
+				try:
+					with transaction.atomic(using=self.db):
+						occurrence.save(force_insert=True, using=self.db)
+				except IntegrityError:
+					# Another writer created it first
+					self.increment(occurrence)
+
+		return occurrences
+
+
+	def increment (self, occurrence: models.Model) -> bool:
+		""" Adds an unsaved instance's occurrences to the existing row for its key. Returns ``False`` if there isn't one. """
+
+		return self.filter(**{self.key_field: getattr(occurrence, self.key_field)}).update(
+			count=F('count') + occurrence.count,
+			first_seen=Least(F('first_seen'), occurrence.first_seen),
+			last_seen=Greatest(F('last_seen'), occurrence.last_seen)
+		) > 0
+
+
+
+class IssueManager (OccurrenceManager):
+	""" Manager for the Issue model. """
+
+	key_field = 'key'
+
+
+	def get_key (self, report):
+		schema = report.schema
+
+		if schema is None:
+			return None
+
+		return fingerprint((schema.type,) + tuple(schema.issue_key(report.body)))
+
+
+	def build (self, report):
+		schema = report.schema
+		title = ' '.join(str(value) for value in schema.issue_key(report.body) if value not in (None, ''))[:255] or schema.name
+
+		return self.model(key=self.get_key(report), type=report.type, title=title)
+
+
+	def assign (self, reports: typing.List[models.Model]):
+		""" Counts unsaved Report instances as occurrences of their issues, and links them to those issues. """
+
+		issues = self.record(reports)
+
+		if not issues:
+			return
+
+		issue_ids = dict(self.filter(key__in=issues).values_list('key', 'pk'))
+
+		for report in reports:
+			report.issue_id = issue_ids.get(self.get_key(report))
+
+
+
+class Issue (models.Model):
+	""" Groups the reports of a single problem, like a CSP directive blocking resources from a particular origin. """
+
+	objects = IssueManager()
+
+	key = models.CharField(max_length=40, unique=True, editable=False, help_text="Identifies the reports of the issue.")
+	type = models.CharField(max_length=120, db_index=True, choices=report_types, help_text="The reports' category.")
+	title = models.CharField(max_length=255, help_text="Summarizes the issue.")
+	first_seen = models.DateTimeField(db_index=True, help_text="When the issue was first reported.")
+	last_seen = models.DateTimeField(db_index=True, help_text="When the issue was last reported.")
+	count = models.PositiveIntegerField(default=0, help_text="The number of reports of the issue.")
+
+
+	class Meta:
+		ordering = ['-last_seen']
+
+
+	@property
+	def schema (self) -> ReportSchema:
+		return report_schema_registry.get(self.type)
+
+
+	def __str__ (self) -> str:
+		return "{}: {}".format(self.schema.name, self.title)
+
+
+
 class Report (models.Model):
 	""" A report filed through the HTTP Reporting API. """
 
 	objects = ReportManager()
 
 	uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-	created_time = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Submission Time", help_text="When the incident report was submitted.")
+	created_time = models.DateTimeField(default=django_timezone.now, db_index=True, editable=False, verbose_name="Submission Time", help_text="When the incident report was submitted.")
 	incident_time = models.DateTimeField(db_index=True, help_text="When the incident occurred.")
 	type = models.CharField(max_length=120, db_index=True, choices=report_types, help_text="The report's category.")
 	url = models.URLField(null=True, help_text="The address of the document or worker from which the report was generated.")
-	body = models.TextField(help_text="The contents of the incident report.")
+	body = ReportBodyField(help_text="The contents of the incident report.")
+	fingerprint = models.CharField(max_length=40, blank=True, db_index=True, editable=False, help_text="Identifies repeats of the same incident.")
+	issue = models.ForeignKey(Issue, null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='reports', help_text="The issue the report belongs to.")
+
+	# Copied from the body, so that reports can be filtered without reading it
+	directive = models.CharField(max_length=120, blank=True, editable=False, help_text="The violated CSP directive, without its value.")
+	blocked_origin = models.CharField(max_length=255, blank=True, db_index=True, editable=False, help_text="The origin of the resource blocked by CSP.")
+	document_host = models.CharField(max_length=255, blank=True, db_index=True, editable=False, help_text="The host of the document or worker from which the report was generated.")
+	hostname = models.CharField(max_length=255, blank=True, db_index=True, editable=False, help_text="The host whose pinned keys failed validation.")
+
+	extracted_fields = ('directive', 'blocked_origin', 'document_host', 'hostname')
+	""" The columns which are filled in by the schema's ``extract_fields``. """
 
 
 	class Meta:
 		ordering = ['-incident_time']
 
+		indexes = [
+			# Serves the newest reports of each type and directive first
+			models.Index(fields=['type', 'directive', '-incident_time'], name='lookout_report_directive_idx'),
+			# Finds the oldest reports of each type, for lookout_prune
+			models.Index(fields=['type', 'created_time'], name='lookout_report_created_idx')
+		]
+
+
+	def save (self, *args, **kwargs):
+		""" Links a new report to its issue as it's saved, if ``GROUP_ISSUES`` is enabled. """
+
+		if not self._state.adding or self.issue_id is not None or not apps.get_app_config('lookout').GROUP_ISSUES:
+			return super().save(*args, **kwargs)
+
+		using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+
+		with transaction.atomic(using=using):
+			Issue.objects.db_manager(using).assign([self])
+			super().save(*args, **kwargs)
+
+
+	def extract_fields (self, schema: typing.Optional[ReportSchema] = None) -> bool:
+		""" Copies values from the body into the indexed columns, returning whether any of them changed. """
+
+		if schema is None:
+			schema = self.schema
+
+		values = schema.extract_fields(self.body) if schema is not None else {}
+		changed = False
+
+		for name in self.extracted_fields:
+			value = values.get(name)
+			value = str(value)[:self._meta.get_field(name).max_length] if value is not None else ''
+
+			if getattr(self, name) != value:
+				setattr(self, name, value)
+				changed = True
+
+		return changed
+
 
 	def pretty_body (self) -> str:
 		""" Displays a nicely-formatted version of a the report's body. """
 		response = highlight(
 			# Reformat the JSON to add whitespace
-			json.dumps(json.loads(self.body), sort_keys=True, indent=2),
+			json_dumps(self.body, pretty=True),
 			JsonLexer(),
 			HtmlFormatter(style='colorful', noclasses=True)
 		)
@@ -103,3 +392,162 @@ class Report (models.Model):
 			self.schema.name,
 			formats.date_format(self.incident_time, 'SHORT_DATETIME_FORMAT')
 		)
+
+
+
+class ReportAggregateManager (OccurrenceManager):
+	""" Manager for the ReportAggregate model. """
+
+	key_field = 'fingerprint'
+
+
+	def get_key (self, report):
+		return report.fingerprint
+
+
+	def build (self, report):
+		return self.model(fingerprint=report.fingerprint, type=report.type, url=report.url, body=report.body)
+
+
+
+class ReportAggregate (models.Model):
+	""" Counts the occurrences of identical reports, which are saved this way instead of individually if ``AGGREGATE_REPORTS`` is enabled. """
+
+	objects = ReportAggregateManager()
+
+	fingerprint = models.CharField(max_length=40, unique=True, editable=False, help_text="Identifies repeats of the same incident.")
+	type = models.CharField(max_length=120, db_index=True, choices=report_types, help_text="The reports' category.")
+	url = models.URLField(null=True, help_text="The address of the document or worker from which the first report was generated.")
+	body = ReportBodyField(help_text="The contents of the first incident report.")
+	first_seen = models.DateTimeField(help_text="When the first incident occurred.")
+	last_seen = models.DateTimeField(db_index=True, help_text="When the latest incident occurred.")
+	count = models.PositiveIntegerField(default=0, help_text="The number of reports of the incident.")
+
+
+	class Meta:
+		ordering = ['-last_seen']
+
+
+	pretty_body = Report.pretty_body
+
+
+	@property
+	def schema (self) -> ReportSchema:
+		return report_schema_registry.get(self.type)
+
+
+	def __str__ (self) -> str:
+		return "{} report ({} occurrences)".format(self.schema.name, self.count)
+
+
+
+class RollupManager (OccurrenceManager):
+	""" Manager for the rollup models. """
+
+	key_field = 'key'
+
+
+	def get_key (self, report):
+		return self.model.get_key(truncate_time(report.incident_time, self.model.period), report.type, *(getattr(report, name) for name in Report.extracted_fields))
+
+
+	def build (self, report):
+		return self.model(
+			key=self.get_key(report),
+			period_start=truncate_time(report.incident_time, self.model.period),
+			type=report.type,
+			**{name: getattr(report, name) for name in Report.extracted_fields}
+		)
+
+
+	def raise_count (self, rollup: models.Model) -> bool:
+		"""
+		Raises the existing row for an unsaved instance's key to its count, if that's higher, and widens its first and last seen times.
+		Returns ``False`` if there isn't one.
+		"""
+
+		return self.filter(key=rollup.key).update(
+			count=Greatest(F('count'), rollup.count),
+			first_seen=Least(F('first_seen'), rollup.first_seen),
+			last_seen=Greatest(F('last_seen'), rollup.last_seen)
+		) > 0
+
+
+
+class Rollup (models.Model):
+	"""
+	Counts the reports which occurred in each period, by their type and the columns extracted from their bodies.
+	Charts and alerts can add up these counts, rather than the reports themselves.
+	"""
+
+	objects = RollupManager()
+
+	period = None
+	""" The length of each period, as accepted by ``lookout.utils.truncate_time``. """
+
+	key = models.CharField(max_length=40, unique=True, editable=False, help_text="Identifies the period and the values counted.")
+	period_start = models.DateTimeField(help_text="When the period started.")
+	type = models.CharField(max_length=120, choices=report_types, help_text="The reports' category.")
+	directive = models.CharField(max_length=120, blank=True, help_text="The violated CSP directive, without its value.")
+	blocked_origin = models.CharField(max_length=255, blank=True, help_text="The origin of the resource blocked by CSP.")
+	document_host = models.CharField(max_length=255, blank=True, help_text="The host of the document or worker from which the reports were generated.")
+	hostname = models.CharField(max_length=255, blank=True, help_text="The host whose pinned keys failed validation.")
+	first_seen = models.DateTimeField(help_text="When the first incident in the period occurred.")
+	last_seen = models.DateTimeField(help_text="When the latest incident in the period occurred.")
+	count = models.PositiveIntegerField(default=0, help_text="The number of reports.")
+
+
+	class Meta:
+		abstract = True
+		ordering = ['-period_start']
+
+
+	@staticmethod
+	def get_key (period_start: datetime, report_type: str, *values) -> str:
+		""" Identifies a period's count of reports with a type and extracted values, in the order of ``Report.extracted_fields``. """
+		return fingerprint((period_start.astimezone(timezone.utc).isoformat(), report_type) + values)
+
+
+	def __str__ (self) -> str:
+		return "{} reports from {}".format(self.count, formats.date_format(self.period_start, 'SHORT_DATETIME_FORMAT'))
+
+
+
+class MinuteRollup (Rollup):
+	period = 'minute'
+
+
+	class Meta (Rollup.Meta):
+		# Index names are unique per database, so each rollup declares its own
+		indexes = [
+			models.Index(fields=['type', 'period_start'], name='lookout_minuterollup_type_idx'),
+			models.Index(fields=['period_start'], name='lookout_minuterollup_start_idx')
+		]
+
+
+
+class HourRollup (Rollup):
+	period = 'hour'
+
+
+	class Meta (Rollup.Meta):
+		indexes = [
+			models.Index(fields=['type', 'period_start'], name='lookout_hourrollup_type_idx'),
+			models.Index(fields=['period_start'], name='lookout_hourrollup_start_idx')
+		]
+
+
+
+class DayRollup (Rollup):
+	period = 'day'
+
+
+	class Meta (Rollup.Meta):
+		indexes = [
+			models.Index(fields=['type', 'period_start'], name='lookout_dayrollup_type_idx'),
+			models.Index(fields=['period_start'], name='lookout_dayrollup_start_idx')
+		]
+
+
+
+rollup_models = {model.period: model for model in [MinuteRollup, HourRollup, DayRollup]}
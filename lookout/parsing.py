@@ -0,0 +1,271 @@
+import codecs
+import json
+import typing
+import zlib
+
+from .exceptions import JSONDecodeError, RequestTooLargeError, ContentEncodingError, UnsupportedContentEncodingError
+
+
+__all__ = ['iter_reports', 'DecompressingStream']
+
+
+WHITESPACE = ' \t\n\r'
+
+
+
+class ReportStreamParser:
+	"""
+	Incrementally decodes a JSON request body, yielding one report at a time.
+
+	A body containing an array of reports is read in chunks, so only the report being decoded needs to be held in memory.
+	A body containing a single report is decoded all at once.
+	"""
+
+	def __init__ (self, stream: typing.BinaryIO, max_bytes: typing.Optional[int] = None, max_reports: typing.Optional[int] = None, chunk_size: int = 8192):
+		self.stream = stream
+		self.max_bytes = max_bytes
+		self.max_reports = max_reports
+		self.chunk_size = chunk_size
+
+		self.decoder = json.JSONDecoder()
+		self.text_decoder = codecs.getincrementaldecoder('utf8')()
+
+		self.buffer = ''
+		self.position = 0
+		self.bytes_read = 0
+		self.eof = False
+
+
+	def read (self, size: int) -> bool:
+		""" Appends more of the body to the buffer. Returns ``False`` if there's nothing left to read. """
+
+		if self.eof:
+			return False
+
+		chunk = self.stream.read(size)
+		self.bytes_read += len(chunk)
+
+		if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+			raise RequestTooLargeError("The request body is larger than {} bytes.".format(self.max_bytes))
+
+		try:
+			text = self.text_decoder.decode(chunk, final=not chunk)
+		except UnicodeDecodeError as e:
+			raise JSONDecodeError(str(e), '', 0)
+
+		if not chunk:
+			self.eof = True
+
+		# Discard whatever has already been parsed
+		self.buffer = self.buffer[self.position:] + text
+		self.position = 0
+
+		return bool(chunk)
+
+
+	def peek (self) -> str:
+		""" Skips whitespace and returns the next character, or an empty string at the end of the body. """
+
+		while True:
+			while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+				self.position += 1
+
+			if self.position < len(self.buffer):
+				return self.buffer[self.position]
+
+			if not self.read(self.chunk_size) and self.position >= len(self.buffer):
+				return ''
+
+
+	def decode_value (self):
+		""" Decodes the next JSON value in the buffer, reading more of the body until it's complete. """
+
+		self.peek()
+
+		while True:
+			try:
+				value, end = self.decoder.raw_decode(self.buffer, self.position)
+			except json.JSONDecodeError:
+				if self.eof:
+					raise
+			else:
+				# A number at the end of the buffer might continue in the next chunk
+				if end < len(self.buffer) or self.eof:
+					self.position = end
+					return value
+
+			# Read larger chunks as the value grows, so decoding isn't retried too many times
+			self.read(max(self.chunk_size, len(self.buffer) - self.position))
+
+
+	def __iter__ (self) -> typing.Iterator:
+		start = self.peek()
+
+		# Fail fast on bodies which can't contain reports, rather than reading them to the end
+		if start not in ('[', '{'):
+			raise JSONDecodeError("Expecting an object or array", self.buffer, self.position)
+
+		if start != '[':
+			# A single report
+			report_data = self.decode_value()
+
+			if self.peek() != '':
+				raise JSONDecodeError("Extra data", self.buffer, self.position)
+
+			yield report_data
+			return
+
+		self.position += 1
+		count = 0
+
+		if self.peek() == ']':
+			self.position += 1
+		else:
+			while True:
+				count += 1
+				if self.max_reports is not None and count > self.max_reports:
+					raise RequestTooLargeError("The request contains more than {} reports.".format(self.max_reports))
+
+				yield self.decode_value()
+
+				separator = self.peek()
+				self.position += 1
+
+				if separator == ']':
+					break
+				elif separator != ',':
+					raise JSONDecodeError("Expecting ',' delimiter", self.buffer, self.position - 1)
+
+		if self.peek() != '':
+			raise JSONDecodeError("Extra data", self.buffer, self.position)
+
+
+
+def iter_reports (stream: typing.BinaryIO, max_bytes: typing.Optional[int] = None, max_reports: typing.Optional[int] = None) -> typing.Iterator:
+	"""
+	Yields each report in a JSON request body as it's decoded.
+
+	Raises ``lookout.exceptions.RequestTooLargeError`` if the body is longer than ``max_bytes`` or contains more than ``max_reports`` reports.
+	"""
+
+	return iter(ReportStreamParser(stream, max_bytes=max_bytes, max_reports=max_reports))
+
+
+
+class DecompressingStream:
+	"""
+	File-like wrapper which decompresses a ``gzip`` or ``deflate`` encoded request body as it's read.
+
+	Guards against decompression bombs by limiting both the decompressed size and the compression ratio.
+	"""
+
+	encodings = {
+		'gzip': 16 + zlib.MAX_WBITS,
+		'x-gzip': 16 + zlib.MAX_WBITS,
+		'deflate': zlib.MAX_WBITS
+	}
+	""" ``zlib`` window sizes for each supported content encoding. """
+
+
+	min_ratio_check = 65536
+	""" The number of decompressed bytes before the compression ratio is enforced, so small, highly-compressible bodies aren't rejected. """
+
+
+	def __init__ (
+		self, stream: typing.BinaryIO, encoding: str,
+		max_input: typing.Optional[int] = None, max_output: typing.Optional[int] = None, max_ratio: typing.Optional[float] = None,
+		chunk_size: int = 8192
+	):
+		try:
+			wbits = self.encodings[encoding]
+		except KeyError:
+			raise UnsupportedContentEncodingError("Unsupported content encoding {!r}.".format(encoding))
+
+		self.stream = stream
+		self.encoding = encoding
+		self.max_input = max_input
+		self.max_output = max_output
+		self.max_ratio = max_ratio
+		self.chunk_size = chunk_size
+
+		self.decompressor = zlib.decompressobj(wbits)
+		self.pending = b''
+		self.bytes_in = 0
+		self.bytes_out = 0
+		# Input consumed before the first output, in case the deflate data turns out to be raw
+		self.header = b'' if encoding == 'deflate' else None
+		self.eof = False
+
+
+	def read (self, size: int = -1) -> bytes:
+		if size is None or size < 0:
+			return b''.join(iter(lambda: self.read(self.chunk_size), b''))
+
+		while not self.eof and len(self.pending) < size:
+			self.fill(size - len(self.pending))
+
+		data, self.pending = self.pending[:size], self.pending[size:]
+
+		return data
+
+
+	def fill (self, size: int):
+		""" Decompresses up to ``size`` more bytes. """
+
+		data = self.decompressor.unconsumed_tail
+
+		if not data:
+			data = self.stream.read(self.chunk_size)
+			self.bytes_in += len(data)
+
+			if self.max_input is not None and self.bytes_in > self.max_input:
+				raise RequestTooLargeError("The request body is larger than {} bytes.".format(self.max_input))
+
+			if not data:
+				self.eof = True
+
+				if not self.decompressor.eof:
+					raise ContentEncodingError("The compressed request body was truncated.")
+
+				return
+
+		try:
+			output = self.decompress(data, size)
+		except zlib.error as e:
+			raise ContentEncodingError("The request body isn't valid {}: {}".format(self.encoding, e))
+
+		self.bytes_out += len(output)
+
+		if self.max_output is not None and self.bytes_out > self.max_output:
+			raise RequestTooLargeError("The decompressed request body is larger than {} bytes.".format(self.max_output))
+
+		if self.max_ratio is not None and self.bytes_out > self.min_ratio_check and self.bytes_out > self.bytes_in * self.max_ratio:
+			raise RequestTooLargeError("The request body's compression ratio is higher than {}.".format(self.max_ratio))
+
+		self.pending += output
+
+		# Ignore anything after the end of the compressed data
+		if self.decompressor.eof:
+			self.eof = True
+
+
+	def decompress (self, data: bytes, size: int) -> bytes:
+		if self.header is not None:
+			self.header += data
+
+		try:
+			output = self.decompressor.decompress(data, size)
+		except zlib.error:
+			# Some clients send raw deflate data without the zlib header
+			if self.header is None:
+				raise
+
+			data, self.header = self.header, None
+			self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+			output = self.decompressor.decompress(data, size)
+
+		# The header has been checked once there's any output
+		if output:
+			self.header = None
+
+		return output
@@ -1,10 +1,15 @@
-from typing import ClassVar, AnyStr
+from typing import ClassVar, AnyStr, Callable, Optional
 
 from logging import getLogger
-from collections import OrderedDict
+from itertools import chain
+from collections import OrderedDict, Counter
+from collections.abc import Mapping
 import jsonschema
 
 from ..exceptions import UnknownSchemaError
+from ..utils import url_hostname
+from .engines import schema_engines
+from .cache import ShapeCache, shape_signature
 
 
 __all__ = ['report_schema_registry', 'ReportSchema']
@@ -63,15 +68,49 @@ class ReportSchema (metaclass=ReportSchemaBase):
 		raise NotImplementedError()
 
 
+	fallback = False
+	""" Fallback schemas are always tried last, after every other schema has failed to match. """
+
+
+	content_types = ()
+	""" Media types which user agents use when sending reports that match the schema. """
+
+
+	@property
+	def discriminators (self):
+		"""
+		``(kind, value)`` pairs which identify reports that are likely to match the schema, used to avoid validating reports against every schema.
+		``('type', value)`` matches the value of a report's ``type`` property, and ``('key', name)`` matches reports with a root property called ``name``.
+		A report which doesn't match any of a schema's discriminators must never be valid according to that schema.
+		"""
+		return ()
+
+
+	validator = None
+	""" Function which returns whether report data matches ``schema``. Created when the schema is registered. """
+
+
+	def compile (self, engine: Optional[Callable] = None):
+		""" Checks that ``schema`` is valid and creates a reusable validator for it. """
+
+		schema = self.schema
+
+		if not isinstance(schema, Mapping):
+			raise jsonschema.SchemaError("{!r} is not a dictionary.".format(schema))
+
+		if engine is None:
+			engine = schema_engines['jsonschema']
+
+		self.validator = engine(schema)
+
+
 	def is_valid (self, report_data: AnyStr):
 		""" Checks to see if the report data matches the schema. """
 
-		try:
-			jsonschema.validate(report_data, self.schema)
-		except jsonschema.ValidationError:
-			return False
-		else:
-			return True
+		if self.validator is None:
+			self.compile()
+
+		return self.validator(report_data)
 
 
 	def normalize(self, report_data):
@@ -80,11 +119,123 @@ class ReportSchema (metaclass=ReportSchemaBase):
 		return self, report_data
 
 
+	@classmethod
+	def fingerprint_key (cls, report_data) -> tuple:
+		"""
+		Values from a normalized report which, along with its type, identify repeats of the same incident.
+		By default, everything but the report's age.
+		"""
+		return ({key: value for key, value in report_data.items() if key != 'age'},)
+
+
+	@classmethod
+	def issue_key (cls, report_data) -> tuple:
+		"""
+		Values from a normalized report which, along with its type, identify the issue it belongs to.
+		Issues are broader than fingerprints, so they usually leave out the page. By default, they're the same.
+		"""
+		return cls.fingerprint_key(report_data)
+
+
+	@classmethod
+	def throttle_key (cls, report_data) -> tuple:
+		"""
+		Values from a normalized report which, along with its type, identify the reports that share a rate limit.
+		By default, every report of the same type shares one limit.
+		"""
+		return ()
+
+
+	@classmethod
+	def extract_fields (cls, report_data) -> dict:
+		"""
+		Values from a normalized report which are copied into indexed columns of ``lookout.models.Report``, keyed by the column's name.
+		By default, the host of the page which triggered the report.
+		"""
+		return {'document_host': url_hostname(report_data.get('url'))}
+
+
 
 class ReportSchemaRegistry (OrderedDict):
 
+	def __init__ (self, *args, engine: str = 'jsonschema', **kwargs):
+		# Maps each discriminator to the schemas which declare it
+		self.index = {}
+
+		# Maps each content type to the schemas which declare it
+		self.content_type_index = {}
+
+		# The number of reports whose content type didn't match their schema
+		self.content_type_mismatches = 0
+
+		# Name of the validation engine used to compile schemas. See ``lookout.report_schemas.engines``.
+		self.engine = engine
+
+		# Remembers which schema matched each report shape
+		self.shape_cache = ShapeCache()
+
+		# The order in which schemas are tried
+		self.trial_order = []
+
+		# Whether ``trial_order`` adapts to how often each schema matches
+		self.adaptive = False
+		self.reorder_interval = 1000
+		self.match_counts = Counter()
+		self._matches_since_reorder = 0
+
+		super().__init__(*args, **kwargs)
+
+
+	def __setitem__ (self, key, schema_instance):
+		self.shape_cache.clear()
+
+		# Remove the schema being replaced from the index
+		if key in self:
+			self.unindex(self[key])
+
+		super().__setitem__(key, schema_instance)
+
+		for discriminator in schema_instance.discriminators:
+			self.index.setdefault(discriminator, []).append(schema_instance)
+
+		for content_type in schema_instance.content_types:
+			self.content_type_index.setdefault(content_type, []).append(schema_instance)
+
+		self.reorder()
+
+
+	def __delitem__ (self, key):
+		self.shape_cache.clear()
+		self.unindex(self[key])
+		super().__delitem__(key)
+
+		self.reorder()
+
+
+	def unindex (self, schema_instance: ReportSchema):
+		""" Removes a schema from the discriminator and content type indexes. """
+
+		for discriminator in schema_instance.discriminators:
+			schemas = self.index.get(discriminator, [])
+			if schema_instance in schemas:
+				schemas.remove(schema_instance)
+
+		for content_type in schema_instance.content_types:
+			schemas = self.content_type_index.get(content_type, [])
+			if schema_instance in schemas:
+				schemas.remove(schema_instance)
+
+
 	def register (self, schema: ClassVar[ReportSchema]) -> ReportSchema:
 		schema_instance = schema()
+
+		# Validate the schema once, rather than every time a report is checked
+		try:
+			schema_instance.compile(schema_engines[self.engine])
+		except jsonschema.SchemaError as e:
+			logger.error("Schema {} is invalid and wasn't registered: {}".format(schema.__name__, e.message))
+			return schema_instance
+
 		self[schema_instance.type] = schema_instance
 
 		logger.debug("Registered schema {!r}".format(schema_instance.type))
@@ -92,16 +243,123 @@ class ReportSchemaRegistry (OrderedDict):
 		return schema_instance
 
 
-	def get_matching_schema (self, report_data: AnyStr):
-		""" Returns the first ``ReportSchema`` class which validates the report data. """
+	def set_engine (self, engine: str):
+		""" Switches to a different validation engine and recompiles the registered schemas. """
+
+		if engine not in schema_engines:
+			raise ValueError("Unknown schema engine {!r}.".format(engine))
+
+		if engine != self.engine:
+			self.engine = engine
+
+			for schema_instance in self.values():
+				schema_instance.compile(schema_engines[engine])
+
+
+	def reorder (self):
+		"""
+		Sorts ``trial_order`` so that the schemas which have matched the most reports are tried first, if ``adaptive`` is enabled.
+		Ties are broken by registration order, and fallback schemas are always last.
+		"""
+
+		positions = {schema: position for position, schema in enumerate(self.values())}
+
+		if self.adaptive:
+			key = lambda schema: (schema.fallback, -self.match_counts[schema.type], positions[schema])
+		else:
+			key = lambda schema: (schema.fallback, positions[schema])
+
+		self.trial_order = sorted(self.values(), key=key)
+		self._matches_since_reorder = 0
+
+
+	def record_match (self, schema: ReportSchema) -> ReportSchema:
+		""" Counts a successful match, periodically updating ``trial_order``. """
+
+		if self.adaptive:
+			self.match_counts[schema.type] += 1
+			self._matches_since_reorder += 1
+
+			if self._matches_since_reorder >= self.reorder_interval:
+				self.reorder()
+				logger.debug("Reordered schemas: {}".format(', '.join(schema.type for schema in self.trial_order)))
+
+		return schema
 
-		for name, schema in self.items():
-			logger.debug("Trying {}".format(name))
+
+	def get_candidates (self, report_data) -> list:
+		""" Looks up the schemas whose discriminators match the report data. """
+
+		if not isinstance(report_data, Mapping):
+			return []
+
+		discriminators = [('key', key) for key in report_data]
+
+		report_type = report_data.get('type')
+		if isinstance(report_type, str):
+			discriminators.insert(0, ('type', report_type))
+
+		candidates = []
+		for discriminator in discriminators:
+			for schema in self.index.get(discriminator, ()):
+				if schema not in candidates:
+					candidates.append(schema)
+
+		if len(candidates) > 1:
+			candidates.sort(key=self.trial_order.index)
+
+		return candidates
+
+
+	def get_matching_schema (self, report_data: AnyStr, content_type: Optional[str] = None):
+		"""
+		Returns the first ``ReportSchema`` class which validates the report data.
+
+		The request's ``content_type``, if provided, is used as a hint about which schemas to try first.
+		"""
+
+		signature = (content_type, shape_signature(report_data))
+
+		# Reports with a familiar shape usually match the same schema
+		schema = self.shape_cache.get(signature)
+		if schema is not None and schema.is_valid(report_data):
+			logger.debug("Validated as {} from the shape cache".format(schema.type))
+			self.shape_cache.record(hit=True)
+
+			return self.record_match(schema)
+
+		self.shape_cache.record(hit=False)
+
+		# Start with the schemas indicated by the content type, then the schemas the report claims to match
+		hinted = self.content_type_index.get(content_type, []) if content_type else []
+		candidates = self.get_candidates(report_data)
+
+		# Then the schemas which can't be ruled out by their discriminators, since the report didn't match the discriminators of the rest
+		undiscriminated = (schema for schema in self.trial_order if not schema.discriminators)
+
+		rejected = []
+
+		for schema in chain(hinted, candidates, undiscriminated):
+			if schema in rejected:
+				continue
+
+			logger.debug("Trying {}".format(schema.type))
 
 			if schema.is_valid(report_data):
-				logger.debug("Validated as {}".format(name))
+				logger.debug("Validated as {}".format(schema.type))
+
+				if hinted and schema not in hinted:
+					logger.debug("Report didn't match its content type {!r}".format(content_type))
+					self.content_type_mismatches += 1
+
+				# Schemas can reject a report because of its values, which aren't part of the signature.
+				# Only a schema whose discriminators the report doesn't match is known to have rejected it because of its shape.
+				if all(rejected_schema.discriminators and rejected_schema not in candidates for rejected_schema in rejected):
+					self.shape_cache.set(signature, schema)
+
+				return self.record_match(schema)
 
-				return schema
+			rejected.append(schema)
 
 		logger.warning("No schemas matched!")
 		raise UnknownSchemaError()
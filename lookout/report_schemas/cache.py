@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
+
+
+__all__ = ['ShapeCache', 'shape_signature']
+
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'max_size', 'size'])
+
+
+
+def shape_signature (report_data) -> tuple:
+	"""
+	Creates a hashable summary of the report's structure: the sorted keys of each nested object, plus the value of its ``type`` property.
+	Reports with the same signature are tried against the same schemas in the same order.
+	"""
+
+	if not isinstance(report_data, Mapping):
+		return (type(report_data).__name__,)
+
+	report_type = report_data.get('type')
+
+	return (
+		report_type if isinstance(report_type, str) else None,
+		tuple(sorted(
+			(key, shape_signature(value) if isinstance(value, Mapping) else None)
+			for key, value in report_data.items()
+		))
+	)
+
+
+
+class ShapeCache:
+	""" Bounded LRU cache of which schema matched each report shape. """
+
+	def __init__ (self, max_size: int = 1024):
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+
+	def get (self, signature: tuple):
+		""" Returns the schema that matched the signature last time, if any. """
+
+		with self._lock:
+			try:
+				schema = self._entries[signature]
+			except KeyError:
+				return None
+
+			self._entries.move_to_end(signature)
+			return schema
+
+
+	def set (self, signature: tuple, schema):
+		if self.max_size <= 0:
+			return
+
+		with self._lock:
+			self._entries[signature] = schema
+			self._entries.move_to_end(signature)
+
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+
+
+	def record (self, hit: bool):
+		""" Counts a lookup which did or didn't avoid trial validation. """
+
+		with self._lock:
+			if hit:
+				self.hits += 1
+			else:
+				self.misses += 1
+
+
+	def clear (self):
+		with self._lock:
+			self._entries.clear()
+
+
+	def info (self) -> CacheInfo:
+		""" Returns the cache's statistics, like ``functools.lru_cache``. """
+
+		return CacheInfo(self.hits, self.misses, self.max_size, len(self._entries))
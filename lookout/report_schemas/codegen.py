@@ -0,0 +1,268 @@
+"""
+Compiles JSON schemas into specialized Python functions, in the style of ``fastjsonschema``.
+
+The generated functions accept and reject exactly the same data as ``jsonschema``'s Draft 4 validator without a format checker, but skip its generic keyword dispatch.
+Only the subset of Draft 4 used by report schemas is supported. Other schemas raise ``UnsupportedSchemaError``.
+"""
+
+import numbers
+import re
+import typing
+
+import jsonschema
+
+
+__all__ = ['UnsupportedSchemaError', 'compile_schema']
+
+
+
+class UnsupportedSchemaError (Exception):
+	""" Raised when a schema uses a keyword which can't be compiled. """
+
+
+
+UNSUPPORTED_KEYWORDS = {'$ref', 'additionalItems', 'dependencies', 'multipleOf', 'patternProperties', 'uniqueItems'}
+""" Draft 4 keywords which aren't implemented by the code generator. """
+
+
+TYPE_CHECKS = {
+	'array': 'isinstance({0}, list)',
+	'boolean': 'isinstance({0}, bool)',
+	'integer': '(isinstance({0}, int) and not isinstance({0}, bool))',
+	'null': '{0} is None',
+	'number': '(isinstance({0}, Number) and not isinstance({0}, bool))',
+	'object': 'isinstance({0}, dict)',
+	'string': 'isinstance({0}, str)'
+}
+""" Python expressions equivalent to each of ``jsonschema``'s Draft 4 type checks. """
+
+
+MAX_NESTING = 12
+""" Sub-schemas nested deeper than this are compiled into separate functions to stay within Python's limit on nested blocks. """
+
+
+
+class CodeGenerator:
+	""" Builds the source code of the validation functions for a schema. """
+
+	def __init__ (self):
+		self.functions = []
+		self.namespace = {'Number': numbers.Number}
+		self.counter = 0
+
+		# Functions which accept any data
+		self.trivial = set()
+
+
+	def name (self, prefix: str) -> str:
+		""" Creates a unique identifier. """
+
+		self.counter += 1
+		return '{}{}'.format(prefix, self.counter)
+
+
+	def constant (self, value) -> str:
+		""" Makes a value available to the generated code and returns its name. """
+
+		name = self.name('constant_')
+		self.namespace[name] = value
+		return name
+
+
+	def function (self, schema: dict) -> str:
+		""" Generates a function which validates data against the schema and returns its name. """
+
+		name = self.name('validate_')
+
+		lines = ['def {}(data):'.format(name)]
+		self.emit(schema, 'data', lines, 1)
+
+		if len(lines) == 1:
+			self.trivial.add(name)
+
+		lines.append('\treturn True')
+
+		self.functions.append('\n'.join(lines))
+
+		return name
+
+
+	def emit (self, schema: dict, var: str, lines: list, depth: int):
+		""" Appends the statements which check ``var`` against the schema, returning ``False`` when it's invalid. """
+
+		if not isinstance(schema, dict):
+			raise UnsupportedSchemaError("Sub-schemas must be dictionaries.")
+
+		unsupported = UNSUPPORTED_KEYWORDS.intersection(schema)
+		if unsupported:
+			raise UnsupportedSchemaError("Unsupported keywords: {}".format(', '.join(sorted(unsupported))))
+
+		# Avoid hitting Python's limit on statically nested blocks
+		if depth > MAX_NESTING:
+			lines.append('{}if not {}({}): return False'.format('\t' * depth, self.function(schema), var))
+			return
+
+		indent = '\t' * depth
+
+		if 'type' in schema:
+			types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+			lines.append('{}if not ({}): return False'.format(indent, ' or '.join(TYPE_CHECKS[t].format(var) for t in types)))
+
+		if 'enum' in schema:
+			lines.append('{}if {} not in {}: return False'.format(indent, var, self.constant(schema['enum'])))
+
+		self.emit_string(schema, var, lines, depth)
+		self.emit_number(schema, var, lines, depth)
+		self.emit_array(schema, var, lines, depth)
+		self.emit_object(schema, var, lines, depth)
+		self.emit_combinators(schema, var, lines, depth)
+
+
+	def emit_string (self, schema: dict, var: str, lines: list, depth: int):
+		checks = []
+
+		if 'minLength' in schema:
+			checks.append('len({}) < {!r}'.format(var, schema['minLength']))
+
+		if 'maxLength' in schema:
+			checks.append('len({}) > {!r}'.format(var, schema['maxLength']))
+
+		if 'pattern' in schema:
+			checks.append('not {}({})'.format(self.constant(re.compile(schema['pattern']).search), var))
+
+		if checks:
+			lines.append('{}if isinstance({}, str):'.format('\t' * depth, var))
+			for check in checks:
+				lines.append('{}if {}: return False'.format('\t' * (depth + 1), check))
+
+
+	def emit_number (self, schema: dict, var: str, lines: list, depth: int):
+		checks = []
+
+		if 'minimum' in schema:
+			operator = '<=' if schema.get('exclusiveMinimum', False) else '<'
+			checks.append('{} {} {!r}'.format(var, operator, schema['minimum']))
+
+		if 'maximum' in schema:
+			operator = '>=' if schema.get('exclusiveMaximum', False) else '>'
+			checks.append('{} {} {!r}'.format(var, operator, schema['maximum']))
+
+		if checks:
+			lines.append('{}if {}:'.format('\t' * depth, TYPE_CHECKS['number'].format(var)))
+			for check in checks:
+				lines.append('{}if {}: return False'.format('\t' * (depth + 1), check))
+
+
+	def emit_array (self, schema: dict, var: str, lines: list, depth: int):
+		block = []
+		indent = '\t' * (depth + 1)
+
+		if 'minItems' in schema:
+			block.append('{}if len({}) < {!r}: return False'.format(indent, var, schema['minItems']))
+
+		if 'maxItems' in schema:
+			block.append('{}if len({}) > {!r}: return False'.format(indent, var, schema['maxItems']))
+
+		items = schema.get('items')
+		if isinstance(items, dict):
+			if items:
+				item_var = self.name('item_')
+				item_block = []
+				self.emit(items, item_var, item_block, depth + 2)
+
+				if item_block:
+					block.append('{}for {} in {}:'.format(indent, item_var, var))
+					block.extend(item_block)
+
+		elif isinstance(items, list):
+			validators = ', '.join(self.function(item) for item in items)
+			block.append('{}for item, validate in zip({}, ({},)):'.format(indent, var, validators))
+			block.append('{}\tif not validate(item): return False'.format(indent))
+
+		if block:
+			lines.append('{}if isinstance({}, list):'.format('\t' * depth, var))
+			lines.extend(block)
+
+
+	def emit_object (self, schema: dict, var: str, lines: list, depth: int):
+		block = []
+		indent = '\t' * (depth + 1)
+
+		for name in schema.get('required', []):
+			block.append('{}if {!r} not in {}: return False'.format(indent, name, var))
+
+		if 'minProperties' in schema:
+			block.append('{}if len({}) < {!r}: return False'.format(indent, var, schema['minProperties']))
+
+		if 'maxProperties' in schema:
+			block.append('{}if len({}) > {!r}: return False'.format(indent, var, schema['maxProperties']))
+
+		properties = schema.get('properties', {})
+		for name, subschema in properties.items():
+			value_var = self.name('value_')
+			property_block = []
+			self.emit(subschema, value_var, property_block, depth + 2)
+
+			if property_block:
+				block.append('{}if {!r} in {}:'.format(indent, name, var))
+				block.append('{}\t{} = {}[{!r}]'.format(indent, value_var, var, name))
+				block.extend(property_block)
+
+		additional = schema.get('additionalProperties', True)
+		if additional is False:
+			block.append('{}if any(key not in {} for key in {}): return False'.format(indent, self.constant(frozenset(properties)), var))
+
+		elif isinstance(additional, dict) and additional:
+			key_var = self.name('key_')
+			block.append('{}for {} in {}:'.format(indent, key_var, var))
+			block.append('{}\tif {} not in {} and not {}({}[{}]): return False'.format(
+				indent, key_var, self.constant(frozenset(properties)), self.function(additional), var, key_var
+			))
+
+		if block:
+			lines.append('{}if isinstance({}, dict):'.format('\t' * depth, var))
+			lines.extend(block)
+
+
+	def emit_combinators (self, schema: dict, var: str, lines: list, depth: int):
+		indent = '\t' * depth
+
+		if 'allOf' in schema:
+			names = [self.function(subschema) for subschema in schema['allOf']]
+			calls = ' and '.join('{}({})'.format(name, var) for name in names if name not in self.trivial)
+
+			if calls:
+				lines.append('{}if not ({}): return False'.format(indent, calls))
+
+		if 'anyOf' in schema:
+			names = [self.function(subschema) for subschema in schema['anyOf']]
+
+			# Nothing to check if any of the sub-schemas accepts everything
+			if not self.trivial.intersection(names):
+				calls = ' or '.join('{}({})'.format(name, var) for name in names)
+				lines.append('{}if not ({}): return False'.format(indent, calls))
+
+		if 'oneOf' in schema:
+			calls = ', '.join('{}({})'.format(self.function(subschema), var) for subschema in schema['oneOf'])
+			lines.append('{}if [{}].count(True) != 1: return False'.format(indent, calls))
+
+		if 'not' in schema:
+			lines.append('{}if {}({}): return False'.format(indent, self.function(schema['not']), var))
+
+
+def compile_schema (schema: dict) -> typing.Callable[[typing.Any], bool]:
+	""" Compiles a Draft 4 JSON schema into a function which returns whether data is valid. """
+
+	if jsonschema.validators.validator_for(schema) is not jsonschema.Draft4Validator:
+		raise UnsupportedSchemaError("Only Draft 4 schemas are supported.")
+
+	generator = CodeGenerator()
+	name = generator.function(schema)
+
+	source = '\n\n\n'.join(generator.functions)
+	exec(compile(source, '<lookout schema {!r}>'.format(schema.get('title', '')), 'exec'), generator.namespace)
+
+	validate = generator.namespace[name]
+	validate.source = source
+
+	return validate
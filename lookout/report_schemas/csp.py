@@ -1,3 +1,4 @@
+from ..utils import url_hostname, url_origin
 from .generic import GenericReportSchema
 from .legacy import LegacyReportSchema
 
@@ -58,6 +59,49 @@ class CSPReportSchema (GenericReportSchema):
 	}
 
 
+	@classmethod
+	def fingerprint_key (cls, report_data):
+		""" Reports of the same directive blocking the same resource on the same page are repeats. """
+
+		body = report_data.get('body', {})
+
+		return (report_data.get('url'), body.get('directive'), body.get('blocked'))
+
+
+	@classmethod
+	def issue_key (cls, report_data):
+		""" Groups reports by the violated directive and the origin of the blocked resource. """
+
+		body = report_data.get('body', {})
+
+		return (body.get('directive', '').split(' ', 1)[0], url_origin(body.get('blocked')))
+
+
+	@classmethod
+	def throttle_key (cls, report_data):
+		""" Limits each violated directive and blocked host separately. """
+
+		body = report_data.get('body', {})
+
+		# Legacy reports may include the directive's value
+		directive = body.get('directive', '').split(' ', 1)[0]
+
+		return (directive, url_hostname(body.get('blocked')))
+
+
+	@classmethod
+	def extract_fields (cls, report_data):
+		""" Indexes the violated directive and the origin of the blocked resource. """
+
+		body = report_data.get('body', {})
+
+		return {
+			**super().extract_fields(report_data),
+			'directive': body.get('directive', '').split(' ', 1)[0],
+			'blocked_origin': url_origin(body.get('blocked'))
+		}
+
+
 
 class LegacyCSPReportSchema (LegacyReportSchema):
 	"""
@@ -68,6 +112,8 @@ class LegacyCSPReportSchema (LegacyReportSchema):
 	generic_class = CSPReportSchema
 	root_object_name = 'csp-report'
 
+	content_types = ('application/csp-report',)
+
 
 	body_schema = {
 		'type': 'object',
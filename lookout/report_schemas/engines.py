@@ -0,0 +1,46 @@
+"""
+Validation engines which compile a JSON schema into a function that returns whether data matches it.
+"""
+
+import typing
+from logging import getLogger
+
+import jsonschema
+
+from .codegen import UnsupportedSchemaError, compile_schema
+
+
+__all__ = ['schema_engines']
+
+
+logger = getLogger(__name__)
+
+
+
+def jsonschema_engine (schema: dict) -> typing.Callable[[typing.Any], bool]:
+	""" Uses a ``jsonschema`` validator. """
+
+	validator_class = jsonschema.validators.validator_for(schema)
+	validator_class.check_schema(schema)
+
+	return validator_class(schema).is_valid
+
+
+def codegen_engine (schema: dict) -> typing.Callable[[typing.Any], bool]:
+	""" Generates specialized Python code for the schema, falling back to ``jsonschema`` if it can't be compiled. """
+
+	jsonschema.validators.validator_for(schema).check_schema(schema)
+
+	try:
+		return compile_schema(schema)
+	except UnsupportedSchemaError as e:
+		logger.info("Falling back to jsonschema for {!r}: {}".format(schema.get('title'), e))
+		return jsonschema_engine(schema)
+
+
+
+schema_engines = {
+	'jsonschema': jsonschema_engine,
+	'codegen': codegen_engine
+}
+""" Available validation engines, by name. """
@@ -13,3 +13,5 @@ class FallbackReportSchema (ReportSchema):
 	description = "An incident report which didn't match any of the known schemas."
 
 	schema = {'type': 'object'}
+
+	fallback = True
@@ -1,3 +1,5 @@
+from django.utils.functional import cached_property
+
 from .base import ReportSchema
 
 
@@ -18,7 +20,15 @@ class GenericReportSchema (ReportSchema):
 		raise NotImplementedError()
 
 
+	content_types = ('application/reports+json',)
+
+
 	@property
+	def discriminators (self):
+		return (('type', self.type),)
+
+
+	@cached_property
 	def schema (self):
 		return {
 			'$schema': "http://json-schema.org/draft-04/schema#",
@@ -78,11 +78,43 @@ class HPKPReportSchema (GenericReportSchema):
 	}
 
 
+	@classmethod
+	def fingerprint_key (cls, report_data):
+		""" Reports of pin validation failing for the same host are repeats. """
+
+		body = report_data.get('body', {})
+
+		return (body.get('hostname'), body.get('port'), body.get('noted-hostname'))
+
+
+	@classmethod
+	def issue_key (cls, report_data):
+		""" Groups reports by the pinned host and port. """
+
+		body = report_data.get('body', {})
+
+		return (body.get('hostname'), body.get('port'))
+
+
+	@classmethod
+	def throttle_key (cls, report_data):
+		""" Limits each pinned host separately. """
+		return (report_data.get('body', {}).get('hostname'),)
+
+
+	@classmethod
+	def extract_fields (cls, report_data):
+		""" Indexes the pinned host. """
+		return {**super().extract_fields(report_data), 'hostname': report_data.get('body', {}).get('hostname')}
+
+
 
 class LegacyHPKPReportSchema (LegacyReportSchema):
 
 	generic_class = HPKPReportSchema
 
+	discriminators = (('key', 'date-time'), ('key', 'hostname'))
+
 
 	def normalize (self, report_data):
 		""" Adapts the legacy HPKP schema to the HTTP Reporting API schema """
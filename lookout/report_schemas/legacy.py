@@ -1,3 +1,5 @@
+from django.utils.functional import cached_property
+
 from .base import ReportSchema
 
 
@@ -34,12 +36,20 @@ class LegacyReportSchema (ReportSchema):
 		return "Legacy {}".format(self.generic_class.description)
 
 
+	@property
+	def discriminators (self):
+		if self.root_object_name is None:
+			return ()
+
+		return (('key', self.root_object_name),)
+
+
 	@property
 	def body_schema (self):
 		return self.generic_class.body_schema
 
 
-	@property
+	@cached_property
 	def schema (self):
 		schema_object = {
 			'$schema': 'http://json-schema.org/draft-04/schema#',
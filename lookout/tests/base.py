@@ -1,3 +1,5 @@
+import json
+import typing
 from pathlib import Path
 
 from django.test import TestCase
@@ -5,6 +7,22 @@ from django.apps import apps
 
 
 
+def csp_report (directive: str = 'script-src', blocked: str = 'https://evil.com/evil.js', age: int = 10, line_number: typing.Optional[int] = None) -> dict:
+	""" Builds a decoded CSP report in the generic schema. """
+
+	body = {'blocked': blocked, 'directive': directive}
+	if line_number is not None:
+		body['line-number'] = line_number
+
+	return {'type': 'csp', 'age': age, 'url': 'https://example.com/', 'body': body}
+
+
+def csp_report_json (*args, **kwargs) -> str:
+	""" Builds a CSP report in the generic schema, encoded as JSON. Takes the same arguments as ``csp_report``. """
+	return json.dumps(csp_report(*args, **kwargs))
+
+
+
 class ReportTestCase (type):
 	fixture_dir = None
 	fixture_pattern = None
@@ -21,18 +21,21 @@ ALLOWED_HOSTS = ['*']
 USE_TZ = True
 
 INSTALLED_APPS = (
+	'django.contrib.admin',
 	'django.contrib.contenttypes',
 	'django.contrib.sessions',
 	'django.contrib.auth',
+	'django.contrib.messages',
 	'django.contrib.staticfiles',
 	'lookout'
 )
 
-MIDDLEWARE_CLASSES = (
+MIDDLEWARE = (
 	'django.middleware.common.CommonMiddleware',
 	'django.middleware.csrf.CsrfViewMiddleware',
 	'django.contrib.sessions.middleware.SessionMiddleware',
 	'django.contrib.auth.middleware.AuthenticationMiddleware',
+	'django.contrib.messages.middleware.MessageMiddleware',
 )
 
 DATABASES = {
@@ -46,7 +49,14 @@ DATABASES = {
 TEMPLATES = [
 	{
 		'BACKEND': 'django.template.backends.django.DjangoTemplates',
-		'APP_DIRS': True
+		'APP_DIRS': True,
+		'OPTIONS': {
+			'context_processors': [
+				'django.template.context_processors.request',
+				'django.contrib.auth.context_processors.auth',
+				'django.contrib.messages.context_processors.messages',
+			]
+		}
 	}
 ]
 
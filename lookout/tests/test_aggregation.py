@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.apps import apps
+from django.test import TestCase
+
+from .base import csp_report, csp_report_json
+from lookout.models import Report, ReportAggregate, Issue
+
+
+
+class ReportAggregateTestCase (TestCase):
+	""" Tests counting repeats of identical reports. """
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+
+
+	def build (self, report_datum: list) -> list:
+		return list(Report.objects.build_from_data(report_datum))
+
+
+	def test_fingerprint (self):
+		first, repeat, other = self.build([csp_report(), csp_report(age=5000, line_number=2), csp_report(blocked='https://other.com/')])
+
+		self.assertEqual(len(first.fingerprint), 40)
+		self.assertEqual(first.fingerprint, repeat.fingerprint)
+		self.assertNotEqual(first.fingerprint, other.fingerprint)
+
+		# The legacy schema has the same fingerprint
+		legacy, = Report.objects.build_from_json('{"csp-report": {"document-uri": "https://example.com/", "blocked-uri": "https://evil.com/evil.js", "violated-directive": "script-src"}}')
+		self.assertEqual(legacy.fingerprint, first.fingerprint)
+
+
+	def test_record (self):
+		report_count = Report.objects.count()
+
+		with mock.patch.object(self.config, 'AGGREGATE_REPORTS', True):
+			first, repeat, other = self.build([csp_report(age=1000), csp_report(), csp_report(blocked='https://other.com/')])
+			Report.objects.save_batch([first, repeat, other])
+			Report.objects.save_batch(self.build([csp_report(age=0)]))
+
+		self.assertEqual(Report.objects.count(), report_count)
+		self.assertEqual(ReportAggregate.objects.count(), 2)
+
+		aggregate = ReportAggregate.objects.get(fingerprint=first.fingerprint)
+		self.assertEqual(aggregate.count, 3)
+		self.assertLess(aggregate.first_seen, aggregate.last_seen)
+		self.assertEqual(aggregate.body['body']['blocked'], 'https://evil.com/evil.js')
+		self.assertEqual(ReportAggregate.objects.get(fingerprint=other.fingerprint).count, 1)
+
+
+	def test_create_from_json (self):
+		report_count = Report.objects.count()
+
+		with mock.patch.object(self.config, 'AGGREGATE_REPORTS', True):
+			list(Report.objects.create_from_json('[{0}, {0}]'.format(csp_report_json())))
+
+		self.assertEqual(Report.objects.count(), report_count)
+		self.assertEqual(ReportAggregate.objects.get().count, 2)
+
+
+	def test_concurrent_create (self):
+		""" Falls back to incrementing when another writer creates the row first. """
+
+		reports = self.build([csp_report()])
+		ReportAggregate.objects.record(reports)
+
+		increment = ReportAggregate.objects.increment
+		results = []
+
+		def missed_increment (aggregate):
+			# The first update runs before the other writer's row exists
+			results.append(increment(aggregate) if results else False)
+			return results[-1]
+
+		with mock.patch.object(ReportAggregate.objects, 'increment', side_effect=missed_increment):
+			ReportAggregate.objects.record(reports)
+
+		self.assertEqual(results, [False, True])
+		self.assertEqual(ReportAggregate.objects.get().count, 2)
+
+
+
+class IssueTestCase (TestCase):
+	""" Tests grouping reports into issues as they're saved. """
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+
+		patcher = mock.patch.object(self.config, 'GROUP_ISSUES', True)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+
+	def test_grouping (self):
+		report_datum = [
+			csp_report(),
+			# Different resources from the same origin are the same issue
+			csp_report(blocked='https://evil.com/other.js', age=5000),
+			csp_report(blocked='https://other.com/')
+		]
+
+		reports = Report.objects.save_batch(list(Report.objects.build_from_data(report_datum)))
+
+		self.assertEqual(reports[0].issue_id, reports[1].issue_id)
+		self.assertNotEqual(reports[0].issue_id, reports[2].issue_id)
+
+		issue = Issue.objects.get(pk=reports[0].issue_id)
+		self.assertEqual(issue.title, 'script-src https://evil.com')
+		self.assertEqual(issue.count, 2)
+		self.assertLess(issue.first_seen, issue.last_seen)
+		self.assertEqual(issue.reports.count(), 2)
+
+		# Later reports are counted in the existing issue
+		report, = Report.objects.create_from_json('{"csp-report": {"document-uri": "https://example.com/", "blocked-uri": "https://evil.com/", "violated-directive": "script-src \'self\'"}}')
+		self.assertEqual(report.issue_id, issue.pk)
+
+		issue.refresh_from_db()
+		self.assertEqual(issue.count, 3)
+
+
+	def test_created_directly (self):
+		""" Tests that reports which weren't built from submitted data, like ones created in the admin, are grouped too. """
+		built, = Report.objects.save_batch(list(Report.objects.build_from_data([csp_report()])))
+
+		report = Report.objects.create(incident_time=built.incident_time, type=built.type, url=built.url, body=built.body)
+		self.assertEqual(report.issue_id, built.issue_id)
+		self.assertEqual(Issue.objects.get(pk=report.issue_id).count, 2)
+
+		# Reports of unknown types don't belong to an issue
+		self.assertIsNone(Report.objects.create(incident_time=built.incident_time, type='unknown', body={}).issue_id)
+
+
+	def test_disabled (self):
+		issue_count = Issue.objects.count()
+
+		with mock.patch.object(self.config, 'GROUP_ISSUES', False):
+			report, = Report.objects.save_batch(list(Report.objects.build_from_data([csp_report()])))
+
+		self.assertIsNone(report.issue_id)
+		self.assertEqual(Issue.objects.count(), issue_count)
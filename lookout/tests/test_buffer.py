@@ -0,0 +1,49 @@
+from django.test import TestCase
+
+from .base import csp_report_json
+from lookout.buffer import ReportBuffer
+from lookout.models import Report
+
+
+
+REPORT_JSON = '[{}]'.format(csp_report_json())
+
+
+
+class ReportBufferTestCase (TestCase):
+	""" Tests the write-behind report buffer without its background thread. """
+
+	def test_flush (self):
+		count = Report.objects.count()
+		buffer = ReportBuffer(max_size=10, batch_size=2)
+
+		reports = [report for _ in range(3) for report in Report.objects.build_from_json(REPORT_JSON)]
+		self.assertEqual(buffer.put(reports), [])
+
+		# Nothing is saved until the buffer is flushed
+		self.assertEqual(Report.objects.count(), count)
+
+		buffer.flush()
+
+		self.assertEqual(Report.objects.count(), count + 3)
+		self.assertTrue(buffer.queue.empty())
+
+
+	def test_overflow (self):
+		buffer = ReportBuffer(max_size=2)
+
+		reports = [report for _ in range(3) for report in Report.objects.build_from_json(REPORT_JSON)]
+
+		# The report which didn't fit is handed back to the caller
+		self.assertEqual(buffer.put(reports), reports[2:])
+		self.assertEqual(buffer.queue.qsize(), 2)
+
+
+	def test_stop_flushes (self):
+		count = Report.objects.count()
+		buffer = ReportBuffer(max_size=10)
+
+		buffer.put(Report.objects.build_from_json(REPORT_JSON))
+		buffer.stop()
+
+		self.assertEqual(Report.objects.count(), count + 1)
@@ -0,0 +1,63 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from lookout.models import Report
+
+
+
+class ExtractedFieldsTestCase (TestCase):
+	""" Tests copying values from report bodies into indexed columns. """
+
+	def build (self, report_json: str) -> Report:
+		report, = Report.objects.build_from_json(report_json)
+		return report
+
+
+	def test_csp (self):
+		report = self.build('{"type": "csp", "age": 10, "url": "https://example.com/page", "body": {"blocked": "https://user@evil.com:8080/evil.js", "directive": "script-src"}}')
+
+		self.assertEqual(report.directive, 'script-src')
+		self.assertEqual(report.blocked_origin, 'https://evil.com:8080')
+		self.assertEqual(report.document_host, 'example.com')
+		self.assertEqual(report.hostname, '')
+
+		# Legacy reports include the directive's value
+		report = self.build('{"csp-report": {"document-uri": "https://example.com/", "blocked-uri": "inline", "violated-directive": "style-src \'self\'"}}')
+
+		self.assertEqual(report.directive, 'style-src')
+		self.assertEqual(report.blocked_origin, 'inline')
+
+
+	def test_hpkp (self):
+		report = self.build('{"type": "hpkp", "age": 10, "url": "https://example.com/", "body": {"hostname": "www.example.com", "port": 443}}')
+
+		self.assertEqual(report.hostname, 'www.example.com')
+		self.assertEqual(report.document_host, 'example.com')
+		self.assertEqual(report.directive, '')
+
+
+	def test_truncated (self):
+		report = self.build('{"type": "csp", "age": 10, "url": "https://example.com/", "body": {"blocked": "inline", "directive": "' + 'a' * 200 + '"}}')
+		self.assertEqual(report.directive, 'a' * 120)
+
+
+	def test_backfill (self):
+		reports = Report.objects.bulk_create_from_json('[{"type": "csp", "age": 10, "url": "https://example.com/", "body": {"blocked": "https://evil.com/", "directive": "script-src"}}, {"type": "hpkp", "age": 10, "url": "https://example.com/", "body": {"hostname": "example.com"}}]')
+		pks = [report.pk for report in reports]
+
+		# Reports saved before the columns existed
+		Report.objects.filter(pk__in=pks).update(directive='', blocked_origin='', document_host='', hostname='')
+
+		out = StringIO()
+		call_command('lookout_backfill', batch_size=1, stdout=out)
+
+		self.assertEqual(Report.objects.filter(pk__in=pks, type='csp', directive='script-src', blocked_origin='https://evil.com').count(), 1)
+		self.assertEqual(Report.objects.filter(pk__in=pks, type='hpkp', hostname='example.com').count(), 1)
+		self.assertIn("Updated 2 of", out.getvalue())
+
+		# Reports which are already filled in are left alone
+		out = StringIO()
+		call_command('lookout_backfill', type=['csp'], stdout=out)
+		self.assertIn("Updated 0 of", out.getvalue())
@@ -1,14 +1,17 @@
 import re
+from datetime import timedelta
 from pkg_resources import parse_version
+from unittest import mock
 
 from django.test import TestCase
 from django.contrib.admin.sites import AdminSite
 from django.apps import apps
 from django.core.checks import Warning
+from django.utils import timezone
 
 import lookout
-from lookout.admin import ReportAdmin
-from lookout.models import Report
+from lookout.admin import ReportAdmin, DirectiveFilter
+from lookout.models import Report, HourRollup
 
 
 
@@ -97,8 +100,8 @@ class TestAdmin (TestCase):
 	""" Ensures that the admin behaves as expected. """
 	fixtures = ['model_tests/reports']
 
-	ALL_FIELDS = ['body', 'created_time', 'incident_time', 'type', 'url', 'pretty_body']
-	DISPLAY_FIELDS = ['created_time', 'incident_time', 'type', 'url', 'pretty_body']
+	ALL_FIELDS = ['body', 'created_time', 'incident_time', 'type', 'url', 'issue', 'pretty_body']
+	DISPLAY_FIELDS = ['created_time', 'incident_time', 'type', 'url', 'issue', 'pretty_body']
 
 
 	def setUp (self):
@@ -132,6 +135,24 @@ class TestAdmin (TestCase):
 		self.assertFalse(self.admin.has_delete_permission(self.request))
 
 
+	def test_directive_filter (self):
+		""" The directives are listed from the rollups, so it doesn't scan the reports. """
+		now = timezone.now()
+
+		for hours, directive in enumerate(['script-src', 'img-src', 'script-src', '']):
+			period_start = now - timedelta(hours=hours)
+			HourRollup.objects.create(key=HourRollup.get_key(period_start, 'csp', directive), period_start=period_start, type='csp', directive=directive, first_seen=period_start, last_seen=period_start, count=1)
+
+		self.assertEqual(DirectiveFilter(self.request, {}, Report, self.admin).lookups(self.request, self.admin), [])
+
+		with mock.patch.object(apps.get_app_config('lookout'), 'ROLLUP_PERIODS', ('minute', 'hour')):
+			directive_filter = DirectiveFilter(self.request, {'directive': 'script-src'}, Report, self.admin)
+			self.assertEqual(directive_filter.lookups(self.request, self.admin), [('img-src', 'img-src'), ('script-src', 'script-src')])
+
+		Report.objects.filter(pk=self.report.pk).update(directive='script-src')
+		self.assertEqual(list(directive_filter.queryset(self.request, Report.objects.all())), [self.report])
+
+
 	def test_readonly_get (self):
 		self.request.method = 'GET'
 
@@ -1,7 +1,21 @@
+import asyncio
+import gzip
+import time
+from unittest import mock, skipIf
+
+import django
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse
-from django.test import Client
+from django.test import Client, RequestFactory, TestCase
 
-from .base import BaseReportTestCase
+from .base import BaseReportTestCase, csp_report_json
+from lookout.backpressure import ingest_monitor
+from lookout.models import Report
+from lookout.report_schemas import report_schema_registry
+from lookout.throttling import client_throttle, report_throttle
+from lookout.utils import json_backends, get_json_backend
+from lookout.views import AsyncReportView
 
 
 
@@ -12,6 +26,14 @@ class HTTPApiTestCase (BaseReportTestCase):
 	.. todo:: Add invalid reports
 	"""
 
+	def setUp (self):
+		report_schema_registry.shape_cache.clear()
+
+
+	def tearDown (self):
+		report_schema_registry.shape_cache.clear()
+
+
 	def test (self):
 		report_url = reverse('lookout:http-report')
 
@@ -23,6 +45,256 @@ class HTTPApiTestCase (BaseReportTestCase):
 		self.assertEqual(response.status_code, 200)
 
 
+	def test_content_types (self):
+		""" Reports are accepted regardless of whether the content type matches their schema. """
+		for content_type in ['application/csp-report', 'application/reports+json']:
+			with self.subTest(content_type=content_type):
+				response = Client().post(reverse('lookout:http-report'), data=self.raw_fixture, content_type=content_type)
+
+				self.assertEqual(response.status_code, 200)
+
+
+
+class InvalidReportTestCase (TestCase):
+	""" Tests that invalid request bodies are rejected. """
+
+	def test_invalid_json (self):
+		for body in [b'{', b'\xff\xfe{}', b'']:
+			with self.subTest(body=body):
+				response = Client().post(reverse('lookout:http-report'), data=body, content_type='application/json')
+
+				self.assertEqual(response.status_code, 400)
+
+
+	def test_prefilter (self):
+		""" Obvious junk is rejected before the body is decoded. """
+		config = apps.get_app_config('lookout')
+
+		response = Client().post(reverse('lookout:http-report'), data=b'{}', content_type='text/html')
+		self.assertEqual(response.status_code, 415)
+
+		response = Client().get(reverse('lookout:http-report'))
+		self.assertEqual(response.status_code, 405)
+
+		with mock.patch.object(config, 'MAX_BODY_SIZE', 10):
+			response = Client().post(reverse('lookout:http-report'), data=b'{}', content_type='application/json', CONTENT_LENGTH='11')
+			self.assertEqual(response.status_code, 413)
+
+		for stream in [False, True]:
+			for body in [b'<html>', b'  "report"', b'12345']:
+				with self.subTest(stream=stream, body=body), mock.patch.object(config, 'STREAM_REPORTS', stream), \
+					mock.patch('lookout.views.json_loads') as json_loads:
+					response = Client().post(reverse('lookout:http-report'), data=body, content_type='application/json')
+
+					self.assertEqual(response.status_code, 400)
+					json_loads.assert_not_called()
+
+
+
+class RequestLimitsTestCase (TestCase):
+	""" Tests the limits on request size, with and without incremental parsing. """
+
+	report = csp_report_json()
+
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+
+
+	def post (self, count: int):
+		return Client().post(reverse('lookout:http-report'), data='[{}]'.format(', '.join([self.report] * count)), content_type='application/reports+json')
+
+
+	def test_limits (self):
+		for stream in [False, True]:
+			with self.subTest(stream=stream), mock.patch.object(self.config, 'STREAM_REPORTS', stream):
+				with mock.patch.object(self.config, 'MAX_REPORTS_PER_REQUEST', 2):
+					self.assertEqual(self.post(2).status_code, 200)
+					self.assertEqual(self.post(3).status_code, 413)
+
+				with mock.patch.object(self.config, 'MAX_BODY_SIZE', len(self.report)):
+					self.assertEqual(self.post(2).status_code, 413)
+
+
+	def test_streaming (self):
+		count = Report.objects.count()
+
+		with mock.patch.object(self.config, 'STREAM_REPORTS', True), mock.patch.object(self.config, 'BATCH_SIZE', 2):
+			self.assertEqual(self.post(5).status_code, 200)
+			self.assertEqual(Report.objects.count(), count + 5)
+
+			# Earlier batches are kept when a later report is invalid
+			response = Client().post(reverse('lookout:http-report'), data='[{}, {}, {}, "invalid"]'.format(self.report, self.report, self.report), content_type='application/reports+json')
+			self.assertEqual(response.status_code, 400)
+			self.assertEqual(Report.objects.count(), count + 7)
+
+
+	def test_json_backends (self):
+		""" Reports which the standard library can decode are saved with every backend, whether or not they're streamed. """
+
+		report = '{"type": "csp", "age": 10, "url": "https://example.com/", "body": {"blocked": "inline", "directive": "script-src", "status-code": 123456789012345678901234567890}}'
+
+		for backend in json_backends:
+			for stream in [False, True]:
+				with self.subTest(backend=backend, stream=stream), mock.patch.object(self.config, 'JSON_BACKEND', backend), mock.patch.object(self.config, 'STREAM_REPORTS', stream):
+					try:
+						get_json_backend(backend)
+					except ImportError:
+						continue
+
+					count = Report.objects.count()
+					response = Client().post(reverse('lookout:http-report'), data=report, content_type='application/reports+json')
+
+					self.assertEqual(response.status_code, 200)
+					self.assertEqual(Report.objects.count(), count + 1)
+
+
+
+class CompressionTestCase (TestCase):
+	""" Tests compressed request bodies, with and without incremental parsing. """
+
+	body = '[{}]'.format(', '.join([RequestLimitsTestCase.report] * 3)).encode('utf8')
+
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+
+
+	def post (self, data: bytes, encoding: str):
+		return Client().post(reverse('lookout:http-report'), data=data, content_type='application/reports+json', HTTP_CONTENT_ENCODING=encoding)
+
+
+	def test_compressed (self):
+		for stream in [False, True]:
+			with self.subTest(stream=stream), mock.patch.object(self.config, 'STREAM_REPORTS', stream):
+				count = Report.objects.count()
+
+				self.assertEqual(self.post(gzip.compress(self.body), 'gzip').status_code, 200)
+				self.assertEqual(self.post(self.body, 'identity').status_code, 200)
+				self.assertEqual(Report.objects.count(), count + 6)
+
+				self.assertEqual(self.post(self.body, 'gzip').status_code, 400)
+				self.assertEqual(self.post(self.body, 'br').status_code, 415)
+
+				with mock.patch.object(self.config, 'MAX_DECOMPRESSED_SIZE', len(self.body) - 1):
+					self.assertEqual(self.post(gzip.compress(self.body), 'gzip').status_code, 413)
+
+				self.assertEqual(self.post(gzip.compress(b' ' * 1000000 + self.body), 'gzip').status_code, 413)
+
+
+
+class BackpressureTestCase (TestCase):
+	""" Tests that the endpoint sheds load while the database can't keep up. """
+
+	report_json = csp_report_json()
+
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+		self.client = Client()
+
+
+	def test_in_flight_limit (self):
+		with mock.patch.object(self.config, 'MAX_IN_FLIGHT_WRITES', 1), ingest_monitor.writing():
+			response = self.client.post(reverse('lookout:http-report'), data=self.report_json, content_type='application/json')
+
+		self.assertEqual(response.status_code, 503)
+		self.assertEqual(response['Retry-After'], str(self.config.RETRY_AFTER))
+
+
+	def test_write_latency_limit (self):
+		now = time.monotonic()
+
+		with mock.patch.object(self.config, 'MAX_WRITE_LATENCY', 1), mock.patch.object(ingest_monitor, 'write_latency', 2):
+			# Recent writes were slow
+			with mock.patch.object(ingest_monitor, 'last_write_time', now):
+				response = self.client.post(reverse('lookout:http-report'), data=self.report_json, content_type='application/json')
+				self.assertEqual(response.status_code, 503)
+
+			# Old measurements are ignored
+			with mock.patch.object(ingest_monitor, 'last_write_time', now - self.config.RETRY_AFTER):
+				response = self.client.post(reverse('lookout:http-report'), data=self.report_json, content_type='application/json')
+				self.assertEqual(response.status_code, 200)
+
+
+
+class AsyncReportViewTestCase (TestCase):
+	""" Tests the async version of the endpoint. """
+
+	report_json = csp_report_json()
+
+
+	@skipIf(django.VERSION >= (4, 1), "Async class-based views are supported")
+	def test_unsupported (self):
+		with self.assertRaises(ImproperlyConfigured):
+			AsyncReportView.as_view()
+
+
+	@skipIf(django.VERSION < (4, 1), "Async class-based views require Django 4.1")
+	def test_async (self):
+		from asgiref.sync import async_to_sync
+
+		view = AsyncReportView.as_view()
+		factory = RequestFactory()
+		count = Report.objects.count()
+
+		response = async_to_sync(view)(factory.post('/', data='[{}, {}]'.format(self.report_json, self.report_json), content_type='application/reports+json'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(Report.objects.count(), count + 2)
+
+		response = async_to_sync(view)(factory.post('/', data='[{}, {{'.format(self.report_json), content_type='application/json'))
+		self.assertEqual(response.status_code, 400)
+
+		response = async_to_sync(view)(factory.post('/', data=self.report_json, content_type='text/plain'))
+		self.assertEqual(response.status_code, 415)
+
+
+	@skipIf(django.VERSION < (4, 1), "Async class-based views require Django 4.1")
+	def test_streaming (self):
+		from asgiref.sync import async_to_sync
+
+		config = apps.get_app_config('lookout')
+		view = AsyncReportView.as_view()
+		factory = RequestFactory()
+		count = Report.objects.count()
+
+		with mock.patch.object(config, 'STREAM_REPORTS', True), mock.patch.object(config, 'BATCH_SIZE', 2), mock.patch.object(Report.objects, 'asave_batch', wraps=Report.objects.asave_batch) as save:
+			response = async_to_sync(view)(factory.post('/', data='[{0}, {0}, {0}]'.format(self.report_json), content_type='application/reports+json'))
+
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(Report.objects.count(), count + 3)
+
+		# Saved in batches as they're decoded
+		self.assertEqual(save.call_count, 2)
+
+
+	@skipIf(django.VERSION < (4, 1), "Async class-based views require Django 4.1")
+	def test_throttles_off_event_loop (self):
+		from asgiref.sync import async_to_sync
+
+		config = apps.get_app_config('lookout')
+		view = AsyncReportView.as_view()
+		factory = RequestFactory()
+
+		def allow (*args, **kwargs):
+			try:
+				asyncio.get_running_loop()
+			except RuntimeError:
+				return True
+
+			raise AssertionError("The throttle was called on the event loop")
+
+		with mock.patch.object(config, 'CLIENT_RATE_LIMIT', 10), mock.patch.object(config, 'RATE_LIMITS', {'csp': 10}), \
+				mock.patch.object(client_throttle, 'allow', side_effect=allow) as client_allow, mock.patch.object(report_throttle, 'allow', side_effect=allow) as report_allow:
+			for stream in (False, True):
+				with mock.patch.object(config, 'STREAM_REPORTS', stream):
+					response = async_to_sync(view)(factory.post('/', data='[{}]'.format(self.report_json), content_type='application/reports+json'))
+					self.assertEqual(response.status_code, 200)
+
+		self.assertEqual(client_allow.call_count, 2)
+		self.assertEqual(report_allow.call_count, 2)
+
+
 
 def load_tests(loader, tests, pattern):
 	# Start off fresh
@@ -31,4 +303,10 @@ def load_tests(loader, tests, pattern):
 	for test_case in HTTPApiTestCase:
 		tests.addTests(loader.loadTestsFromTestCase(test_case))
 
+	tests.addTests(loader.loadTestsFromTestCase(InvalidReportTestCase))
+	tests.addTests(loader.loadTestsFromTestCase(RequestLimitsTestCase))
+	tests.addTests(loader.loadTestsFromTestCase(CompressionTestCase))
+	tests.addTests(loader.loadTestsFromTestCase(BackpressureTestCase))
+	tests.addTests(loader.loadTestsFromTestCase(AsyncReportViewTestCase))
+
 	return tests
@@ -0,0 +1,93 @@
+from unittest import skipIf
+
+import django
+from django.core import signals
+from django.db import close_old_connections
+from django.test import RequestFactory, TestCase, TransactionTestCase
+
+from .base import csp_report_json
+from lookout.ingest import IngestWSGIHandler, IngestASGIHandler
+from lookout.models import Report
+
+
+
+REPORT_JSON = '[{}]'.format(csp_report_json())
+
+
+
+class IngestWSGIApplicationTestCase (TestCase):
+	""" Tests the standalone WSGI application. """
+
+	def setUp (self):
+		# Like Django's test client, keep the test's transaction open between requests
+		signals.request_started.disconnect(close_old_connections)
+		signals.request_finished.disconnect(close_old_connections)
+
+
+	def tearDown (self):
+		signals.request_started.connect(close_old_connections)
+		signals.request_finished.connect(close_old_connections)
+
+
+	def wsgi_request (self, path: str, body: str, content_type: str = 'application/json'):
+		environ = RequestFactory().post(path, data=body, content_type=content_type).environ
+		result = {}
+
+		def start_response (status, headers):
+			result['status'] = status
+
+		response = IngestWSGIHandler()(environ, start_response)
+		content = b''.join(response)
+		response.close()
+
+		return result['status'], content
+
+
+	def test_wsgi (self):
+		count = Report.objects.count()
+
+		# Every path is handled by the report view
+		for path in ['/', '/anything']:
+			with self.subTest(path=path):
+				status, content = self.wsgi_request(path, REPORT_JSON)
+				self.assertEqual(status, '200 OK')
+
+		self.assertEqual(Report.objects.count(), count + 2)
+
+		status, content = self.wsgi_request('/', '{')
+		self.assertEqual(status, '400 Bad Request')
+
+		status, content = self.wsgi_request('/', REPORT_JSON, content_type='text/plain')
+		self.assertEqual(status, '415 Unsupported Media Type')
+
+
+
+class IngestASGIApplicationTestCase (TransactionTestCase):
+	"""
+	Tests the standalone ASGI application.
+
+	Django's ASGI handler saves the reports in a separate thread, which can't see the data inside a ``TestCase``'s transaction.
+	"""
+
+	@skipIf(IngestASGIHandler is None or django.VERSION < (3, 1), "The async handler requires Django 3.1")
+	def test_asgi (self):
+		from asgiref.sync import async_to_sync
+		from asgiref.testing import ApplicationCommunicator
+
+		count = Report.objects.count()
+
+		@async_to_sync
+		async def request (body: bytes) -> int:
+			scope = {'type': 'http', 'method': 'POST', 'path': '/', 'query_string': b'', 'headers': [(b'content-type', b'application/json')]}
+			communicator = ApplicationCommunicator(IngestASGIHandler(), scope)
+
+			await communicator.send_input({'type': 'http.request', 'body': body})
+			response_start = await communicator.receive_output()
+			await communicator.receive_output()
+			await communicator.wait()
+
+			return response_start['status']
+
+		self.assertEqual(request(REPORT_JSON.encode('utf8')), 200)
+		self.assertEqual(request(b'{'), 400)
+		self.assertEqual(Report.objects.count(), count + 1)
@@ -1,14 +1,32 @@
-from django.test import TestCase
+import json
+
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
 from django.apps import apps
+from django.core.management import call_command
 from django.db.migrations.executor import MigrationExecutor
 from django.db import connection
 
+from lookout import fields
+
+
 
+class TestMigrations (SimpleTestCase):
+	"""
+	Runs the migrations between ``migrate_from`` and ``migrate_to`` once for the test case.
+
+	The migrations aren't run in a transaction, since SQLite can't alter tables inside one while foreign key checks are enabled.
+	"""
 
-class TestMigrations (TestCase):
 	migrate_from = None
 	migrate_to = None
 
+	fixtures = []
+
+	databases = {'default'}
+	allow_database_queries = True  # Django < 2.2
+
 
 	@classmethod
 	def setUpBeforeMigration (cls, migrate_from_apps):
@@ -29,9 +47,11 @@ class TestMigrations (TestCase):
 		migrate_from_apps = executor.loader.project_state(migrate_from).apps
 		cls.apps = executor.loader.project_state(migrate_to).apps
 
-		# Run the super-method now to load the fixtures
 		super().setUpClass()
 
+		if cls.fixtures:
+			call_command('loaddata', *cls.fixtures, verbosity=0)
+
 		# Reverse the migrations to the starting point (migrate_from)
 		executor.migrate(migrate_from)
 
@@ -45,6 +65,17 @@ class TestMigrations (TestCase):
 		# Ready to run some tests!
 
 
+	@classmethod
+	def tearDownClass (cls):
+		# Leave the database migrated and empty for the other tests
+		executor = MigrationExecutor(connection)
+		executor.migrate(executor.loader.graph.leaf_nodes(cls.app_name))
+
+		call_command('flush', interactive=False, verbosity=0)
+
+		super().tearDownClass()
+
+
 
 class UpgradeTo011TestCase (TestMigrations):
 	migrate_from = '0001_initial'
@@ -62,7 +93,7 @@ class UpgradeTo011TestCase (TestMigrations):
 
 	def test_uuids_created (self):
 		""" Tests that migrated ``Report``s have valid UUIDs. """
-		Report = apps.get_model(self.app_name, 'Report')
+		Report = self.apps.get_model(self.app_name, 'Report')
 
 		# Get all of the reports
 		reports = Report.objects.all()
@@ -79,9 +110,96 @@ class UpgradeTo011TestCase (TestMigrations):
 
 	def test_created_date_values (self):
 		""" Tests that migrated ``Report``s can still be accessed based on their former primary key. """
-		Report = apps.get_model(self.app_name, 'Report')
+		Report = self.apps.get_model(self.app_name, 'Report')
 
 		reports = Report.objects.filter(created_time__in=self.old_pks)
 
 		# Make sure they're all still there
 		self.assertEqual(len(self.old_pks), len(reports))
+
+
+
+class JSONBodyTestCase (TestMigrations):
+	migrate_from = '0006_issues'
+	migrate_to = '0007_json_body'
+
+	fixtures = ['model_tests/reports']
+
+
+	@classmethod
+	def setUpBeforeMigration (cls, apps):
+		Report = apps.get_model(cls.app_name, 'Report')
+
+		cls.old_bodies = dict(Report.objects.values_list('pk', 'body'))
+
+
+	def test_bodies_converted (self):
+		""" Tests that report bodies are decoded from the JSON text they were stored as. """
+		Report = self.apps.get_model(self.app_name, 'Report')
+
+		self.assertGreaterEqual(len(self.old_bodies), 2)
+
+		for pk, old_body in self.old_bodies.items():
+			with self.subTest(pk=pk):
+				self.assertIsInstance(old_body, str)
+				self.assertEqual(Report.objects.get(pk=pk).body, json.loads(old_body))
+
+
+
+class NativeJSONColumnsTestCase (TestCase):
+	def get_connection (self, vendor, data_type):
+		""" Returns a mock connection whose report body columns have the given type. """
+		connection = mock.MagicMock(vendor=vendor, mysql_is_mariadb=False)
+		connection.ops.quote_name = '"{}"'.format
+
+		cursor = connection.cursor.return_value.__enter__.return_value
+		cursor.fetchone.return_value = (data_type,)
+
+		return connection, cursor
+
+
+	def test_sqlite (self):
+		""" Tests that there's nothing to convert on databases without a native JSON type. """
+		self.assertEqual(fields.text_json_columns(connection), [])
+
+
+	def test_text_columns_converted (self):
+		""" Tests that report bodies stored as text are converted to native JSON columns. """
+		with mock.patch.object(fields, 'NATIVE_JSON_FIELD', True):
+			mock_connection, cursor = self.get_connection('postgresql', 'text')
+
+			self.assertEqual(fields.convert_json_columns(mock_connection), [('lookout_report', 'body'), ('lookout_reportaggregate', 'body')])
+			cursor.execute.assert_any_call('ALTER TABLE "lookout_report" ALTER COLUMN "body" TYPE jsonb USING "body"::jsonb')
+
+			mock_connection, cursor = self.get_connection('mysql', 'longtext')
+
+			self.assertEqual(len(fields.convert_json_columns(mock_connection)), 2)
+			cursor.execute.assert_any_call('ALTER TABLE "lookout_reportaggregate" MODIFY "body" json NOT NULL')
+
+
+	def test_native_columns_left_alone (self):
+		""" Tests that native JSON columns, and databases on versions of Django without them, aren't converted. """
+		mock_connection, cursor = self.get_connection('postgresql', 'jsonb')
+
+		with mock.patch.object(fields, 'NATIVE_JSON_FIELD', True):
+			self.assertEqual(fields.convert_json_columns(mock_connection), [])
+
+		mock_connection, cursor = self.get_connection('postgresql', 'text')
+
+		with mock.patch.object(fields, 'NATIVE_JSON_FIELD', False):
+			self.assertEqual(fields.convert_json_columns(mock_connection), [])
+			self.assertEqual(fields.check_json_columns(None), [])
+
+
+	def test_body_index (self):
+		""" Tests that report bodies are only given a GIN index if the ``BODY_INDEX`` setting is enabled. """
+		mock_connection, cursor = self.get_connection('postgresql', 'jsonb')
+
+		with mock.patch.object(fields, 'NATIVE_JSON_FIELD', True):
+			self.assertFalse(fields.create_body_index(mock_connection))
+			cursor.execute.assert_not_called()
+
+			with mock.patch.object(apps.get_app_config('lookout'), 'BODY_INDEX', True):
+				self.assertTrue(fields.create_body_index(mock_connection))
+
+		cursor.execute.assert_called_with('CREATE INDEX CONCURRENTLY IF NOT EXISTS lookout_report_body_gin ON lookout_report USING gin (body)')
@@ -0,0 +1,138 @@
+import gzip
+import io
+import json
+import zlib
+from pathlib import Path
+
+from django.apps import apps
+from django.test import TestCase
+
+from lookout.exceptions import JSONDecodeError, RequestTooLargeError, ContentEncodingError, UnsupportedContentEncodingError
+from lookout.parsing import ReportStreamParser, DecompressingStream, iter_reports
+
+
+
+class TestReportStreamParser (TestCase):
+	""" Tests incremental decoding of request bodies. """
+
+	def parse (self, body: bytes, chunk_size: int = 8192, **kwargs) -> list:
+		return list(ReportStreamParser(io.BytesIO(body), chunk_size=chunk_size, **kwargs))
+
+
+	def test_fixtures (self):
+		""" Gives the same results as decoding the whole body at once, regardless of chunk size. """
+		for fixture_file in Path(apps.get_app_config('lookout').path, 'fixtures', 'report_tests').glob('*.json'):
+			body = fixture_file.read_bytes()
+
+			expected = json.loads(body.decode('utf8'))
+			if not isinstance(expected, list):
+				expected = [expected]
+
+			for chunk_size in [1, 7, 64, 8192]:
+				with self.subTest(fixture=fixture_file.stem, chunk_size=chunk_size):
+					self.assertEqual(self.parse(body, chunk_size=chunk_size), expected)
+
+
+	def test_values (self):
+		for body, expected in [
+			(b'[]', []),
+			(b' [ ] ', []),
+			(b'[12345, "\xc3\xa9", true, null]', [12345, 'é', True, None]),
+			(b'{"a": 1}', [{'a': 1}]),
+			(b'\n[{"a": 1},\n {"b": [2]}]\n', [{'a': 1}, {'b': [2]}]),
+		]:
+			for chunk_size in [1, 2, 3, 100]:
+				with self.subTest(body=body, chunk_size=chunk_size):
+					self.assertEqual(self.parse(body, chunk_size=chunk_size), expected)
+
+
+	def test_invalid (self):
+		for body in [b'', b'[', b'[{}', b'[{},]', b'[{} {}]', b'[{}] x', b'{} {}', b'{"a": tru}', b'[\xff]']:
+			for chunk_size in [1, 100]:
+				with self.subTest(body=body, chunk_size=chunk_size):
+					with self.assertRaises(JSONDecodeError):
+						self.parse(body, chunk_size=chunk_size)
+
+
+	def test_fail_fast (self):
+		""" Bodies which can't contain reports are rejected without reading them to the end. """
+		stream = io.BytesIO(b'<html>' + b'x' * 100000)
+
+		with self.assertRaises(JSONDecodeError):
+			list(ReportStreamParser(stream, chunk_size=16))
+
+		self.assertEqual(stream.tell(), 16)
+
+
+	def test_max_bytes (self):
+		with self.assertRaises(RequestTooLargeError):
+			self.parse(b'[{"a": "' + b'x' * 100 + b'"}]', chunk_size=10, max_bytes=50)
+
+		self.assertEqual(len(self.parse(b'[{}]', max_bytes=4)), 1)
+
+
+	def test_max_reports (self):
+		reports = iter_reports(io.BytesIO(b'[{}, {}, {}]'), max_reports=2)
+
+		# The limit is only hit once the third report is reached
+		self.assertEqual(next(reports), {})
+		self.assertEqual(next(reports), {})
+
+		with self.assertRaises(RequestTooLargeError):
+			next(reports)
+
+
+
+class TestDecompressingStream (TestCase):
+	""" Tests decompression of request bodies. """
+
+	body = b'[' + b', '.join([b'{"type": "csp", "url": "https://example.com/"}'] * 100) + b']'
+
+
+	def decompress (self, data: bytes, encoding: str, chunk_size: int = 8192, **kwargs) -> bytes:
+		stream = DecompressingStream(io.BytesIO(data), encoding, chunk_size=chunk_size, **kwargs)
+		return b''.join(iter(lambda: stream.read(chunk_size), b''))
+
+
+	def test_encodings (self):
+		raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+		for encoding, data in [
+			('gzip', gzip.compress(self.body)),
+			('x-gzip', gzip.compress(self.body)),
+			('deflate', zlib.compress(self.body)),
+			('deflate', raw_deflate.compress(self.body) + raw_deflate.flush())
+		]:
+			for chunk_size in [1, 13, 8192]:
+				with self.subTest(encoding=encoding, chunk_size=chunk_size):
+					self.assertEqual(self.decompress(data, encoding, chunk_size=chunk_size), self.body)
+
+
+	def test_parser (self):
+		stream = DecompressingStream(io.BytesIO(gzip.compress(self.body)), 'gzip', chunk_size=16)
+		self.assertEqual(list(iter_reports(stream)), json.loads(self.body.decode('utf8')))
+
+
+	def test_invalid (self):
+		with self.assertRaises(UnsupportedContentEncodingError):
+			DecompressingStream(io.BytesIO(self.body), 'br')
+
+		for data in [self.body, gzip.compress(self.body)[:-20]]:
+			with self.subTest(data=data[:10]), self.assertRaises(ContentEncodingError):
+				self.decompress(data, 'gzip')
+
+
+	def test_limits (self):
+		bomb = gzip.compress(b' ' * 1000000)
+
+		with self.assertRaises(RequestTooLargeError):
+			self.decompress(self.body, 'gzip', max_input=len(self.body) - 1)
+
+		with self.assertRaises(RequestTooLargeError):
+			self.decompress(bomb, 'gzip', max_output=100000)
+
+		with self.assertRaises(RequestTooLargeError):
+			self.decompress(bomb, 'gzip', max_ratio=100)
+
+		# Small bodies aren't subject to the ratio limit
+		self.assertEqual(self.decompress(gzip.compress(self.body), 'gzip', max_ratio=1), self.body)
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase
+
+from lookout.utils import truncate_time
+from lookout.management.commands.lookout_partitions import Command, next_period
+
+
+
+class PartitionsTestCase (SimpleTestCase):
+	""" Tests the ``lookout_partitions`` command's helpers, since partitioning is only supported on PostgreSQL. """
+
+	def test_periods (self):
+		moment = datetime(2024, 1, 31, 15, 30, tzinfo=timezone.utc)
+
+		for period, start, following in [
+			('day', datetime(2024, 1, 31, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc)),
+			('week', datetime(2024, 1, 29, tzinfo=timezone.utc), datetime(2024, 2, 5, tzinfo=timezone.utc)),
+			('month', datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc)),
+		]:
+			with self.subTest(period=period):
+				self.assertEqual(truncate_time(moment, period), start)
+				self.assertEqual(next_period(start, period), following)
+
+
+	def test_create_partition_sql (self):
+		self.assertEqual(
+			Command.create_partition_sql('lookout_report', 'lookout_report_p20240101', datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc)),
+			"CREATE TABLE lookout_report_p20240101 PARTITION OF lookout_report FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-02-01 00:00:00+00')"
+		)
+
+
+	def test_get_partitions (self):
+		cursor = mock.Mock()
+		cursor.fetchall.return_value = [
+			('lookout_report_p20240101', "FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-02-01 00:00:00+00')"),
+			('lookout_report_default', 'DEFAULT')
+		]
+
+		self.assertEqual(Command.get_partitions(cursor, 'lookout_report'), {
+			'lookout_report_p20240101': (datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc)),
+			'lookout_report_default': (None, None)
+		})
+
+
+	def test_unsupported_database (self):
+		with self.assertRaisesMessage(CommandError, "only supported on PostgreSQL"):
+			call_command('lookout_partitions', '--dry-run')
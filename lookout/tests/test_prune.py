@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from lookout.models import Report, MinuteRollup, HourRollup
+
+
+
+class PruneTestCase (TestCase):
+	""" Tests deleting expired reports. """
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+		now = datetime.now(timezone.utc)
+
+		Report.objects.all().delete()
+		self.reports = {}
+
+		for report_type, days in [('csp', 10), ('csp', 40), ('csp', 50), ('csp', 60), ('hpkp', 400), ('misc', 1000)]:
+			created_time = now - timedelta(days=days)
+			report = Report.objects.create(type=report_type, created_time=created_time, incident_time=created_time, url='https://example.com/', body={})
+			self.reports.setdefault(report_type, []).append(report.pk)
+
+
+	def prune (self, *args) -> str:
+		out = StringIO()
+
+		with mock.patch.object(self.config, 'RETENTION', {'csp': 30, 'hpkp': 365}), mock.patch.object(self.config, 'ROLLUP_RETENTION', {'minute': 7}), mock.patch('time.sleep') as sleep:
+			call_command('lookout_prune', *args, stdout=out)
+
+		self.sleep_count = sleep.call_count
+		return out.getvalue()
+
+
+	def test_prune (self):
+		output = self.prune('--batch-size=2')
+
+		self.assertIn("Deleted 3 csp reports.", output)
+		self.assertIn("Deleted 1 hpkp reports.", output)
+
+		# Types without a retention period are kept
+		self.assertEqual(list(Report.objects.order_by('type').values_list('pk', flat=True)), [self.reports['csp'][0], self.reports['misc'][0]])
+
+		# Waits between full batches
+		self.assertEqual(self.sleep_count, 1)
+
+
+	def test_same_time (self):
+		""" Reports submitted at the same time are all deleted, even when they're split across batches. """
+		created_time = datetime.now(timezone.utc) - timedelta(days=100)
+
+		for _ in range(3):
+			Report.objects.create(type='csp', created_time=created_time, incident_time=created_time, url='https://example.com/', body={})
+
+		self.assertIn("Deleted 6 csp reports.", self.prune('--batch-size=2', '--type=csp'))
+		self.assertEqual(Report.objects.filter(type='csp').count(), 1)
+
+
+	def test_dry_run (self):
+		count = Report.objects.count()
+		output = self.prune('--dry-run', '--type=csp')
+
+		self.assertIn("Would delete 3 csp reports.", output)
+		self.assertNotIn("hpkp", output)
+		self.assertEqual(Report.objects.count(), count)
+
+
+	def test_rollups (self):
+		now = datetime.now(timezone.utc)
+
+		for model, days in [(MinuteRollup, 1), (MinuteRollup, 8), (MinuteRollup, 9), (HourRollup, 1000)]:
+			period_start = now - timedelta(days=days)
+			model.objects.create(key=model.get_key(period_start, 'csp'), period_start=period_start, type='csp', first_seen=period_start, last_seen=period_start, count=1)
+
+		self.assertIn("Would delete 2 minute rollups.", self.prune('--dry-run', '--period=minute'))
+
+		output = self.prune('--batch-size=1')
+
+		self.assertIn("Deleted 2 minute rollups.", output)
+		self.assertEqual(MinuteRollup.objects.count(), 1)
+
+		# Periods without a retention period are kept
+		self.assertNotIn("hour", output)
+		self.assertEqual(HourRollup.objects.count(), 1)
+
+
+	def test_backfilled_rollups (self):
+		""" Rollups are deleted oldest first, even when older periods were backfilled after newer ones. """
+		now = datetime.now(timezone.utc)
+
+		for days, report_type in [(1, 'csp'), (8, 'csp'), (20, 'csp'), (20, 'hpkp'), (20, 'misc'), (9, 'csp')]:
+			period_start = now - timedelta(days=days)
+			MinuteRollup.objects.create(key=MinuteRollup.get_key(period_start, report_type), period_start=period_start, type=report_type, first_seen=period_start, last_seen=period_start, count=1)
+
+		self.assertIn("Deleted 5 minute rollups.", self.prune('--batch-size=2', '--period=minute'))
+		self.assertEqual(MinuteRollup.objects.count(), 1)
+		self.assertEqual(self.sleep_count, 2)
+
+
+	def test_unknown_type (self):
+		with self.assertRaisesMessage(CommandError, "misc"):
+			self.prune('--type=misc')
+
+		with self.assertRaisesMessage(CommandError, "hour"):
+			self.prune('--period=hour')
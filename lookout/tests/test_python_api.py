@@ -1,4 +1,10 @@
+from unittest import mock
+
+from django.apps import apps
+from django.test import TestCase
+
 from .base import BaseReportTestCase
+from lookout.exceptions import UnknownSchemaError
 from lookout.models import Report
 
 
@@ -25,6 +31,59 @@ class PythonApiTestCase(BaseReportTestCase):
 
 				self.assertEqual(report, fetched_report)
 
+				# The body is decoded when it's loaded
+				self.assertIsInstance(fetched_report.body, dict)
+				self.assertEqual(fetched_report.body, report.body)
+
+
+	def test_bulk (self):
+		count = Report.objects.count()
+
+		# Create and save the Report instances in one go
+		reports = Report.objects.bulk_create_from_json(self.raw_fixture, batch_size=1)
+
+		self.assertGreater(len(reports), 0)
+		self.assertEqual(Report.objects.count(), count + len(reports))
+
+
+
+class BulkCreateTestCase (TestCase):
+	""" Tests that batches of reports are saved atomically. """
+
+	def test_invalid_report_aborts_batch (self):
+		# The second report doesn't match any schema, not even the fallback
+		report_json = '[{"csp-report": {"document-uri": "http://example.com/", "blocked-uri": "http://evil.com/", "violated-directive": "script-src"}}, "nonsense"]'
+
+		count = Report.objects.count()
+
+		with self.assertRaises(UnknownSchemaError):
+			Report.objects.bulk_create_from_json(report_json)
+
+		self.assertEqual(Report.objects.count(), count)
+
+
+
+class TimeOrderedUUIDTestCase (TestCase):
+	""" Tests the ``TIME_ORDERED_UUIDS`` setting. """
+
+	report_json = '{"csp-report": {"document-uri": "http://example.com/", "blocked-uri": "http://evil.com/", "violated-directive": "script-src"}}'
+
+
+	def test_enabled (self):
+		with mock.patch.object(apps.get_app_config('lookout'), 'TIME_ORDERED_UUIDS', True):
+			report, = Report.objects.create_from_json(self.report_json)
+
+		self.assertEqual(report.uuid.version, 7)
+
+		# The UUID starts with the time the report was submitted
+		self.assertEqual(int(report.uuid.hex[:12], 16), int(report.created_time.timestamp() * 1000))
+		self.assertEqual(Report.objects.get(pk=report.pk).created_time, report.created_time)
+
+
+	def test_disabled (self):
+		report, = Report.objects.build_from_json(self.report_json)
+		self.assertEqual(report.uuid.version, 4)
+
 
 
 def load_tests(loader, tests, pattern):
@@ -35,4 +94,7 @@ def load_tests(loader, tests, pattern):
 	for test_case in PythonApiTestCase:
 		tests.addTests(loader.loadTestsFromTestCase(test_case))
 
+	tests.addTests(loader.loadTestsFromTestCase(BulkCreateTestCase))
+	tests.addTests(loader.loadTestsFromTestCase(TimeOrderedUUIDTestCase))
+
 	return tests
@@ -0,0 +1,350 @@
+import json
+from pathlib import Path
+from unittest import mock
+
+from django.apps import apps
+from django.test import TestCase
+
+from lookout.report_schemas import report_schema_registry
+from lookout.report_schemas.base import ReportSchema, ReportSchemaRegistry
+from lookout.report_schemas.cache import ShapeCache, shape_signature
+from lookout.report_schemas.codegen import UnsupportedSchemaError, compile_schema
+from lookout.report_schemas.engines import schema_engines
+
+
+
+class TestCompiledSchemas (TestCase):
+	""" Tests that registered schemas are only compiled once. """
+
+	def test_validators_compiled (self):
+		for schema in report_schema_registry.values():
+			with self.subTest(schema=schema.type):
+				self.assertIsNotNone(schema.validator)
+
+				# The schema dictionary isn't rebuilt on each access
+				self.assertIs(schema.schema, schema.schema)
+
+
+	def test_invalid_schema_not_registered (self):
+		class InvalidSchema (ReportSchema):
+			type = 'invalid_schema_test'
+			name = "Invalid"
+			description = "Invalid"
+			schema = {'type': 'not a real type'}
+
+		self.assertNotIn('invalid_schema_test', report_schema_registry)
+
+
+
+class TestDiscriminatorDispatch (TestCase):
+	""" Tests that reports are only validated against the schemas they're likely to match. """
+
+	def scan (self, report_data):
+		""" Finds the matching schema by trying every schema in order. """
+		for schema in report_schema_registry.values():
+			if schema.is_valid(report_data):
+				return schema
+
+
+	def test_fixtures (self):
+		""" Dispatch finds the same schema as a full scan. """
+		for fixture_file in Path(apps.get_app_config('lookout').path, 'fixtures', 'report_tests').glob('*.json'):
+			report_datum = json.loads(fixture_file.read_text())
+
+			if not isinstance(report_datum, list):
+				report_datum = [report_datum]
+
+			for report_data in report_datum:
+				with self.subTest(fixture=fixture_file.stem, type=report_data.get('type')):
+					self.assertIs(report_schema_registry.get_matching_schema(report_data), self.scan(report_data))
+
+
+	def test_candidates (self):
+		def get_types (report_data):
+			return [schema.type for schema in report_schema_registry.get_candidates(report_data)]
+
+		self.assertEqual(get_types({'type': 'csp', 'age': 0, 'url': '', 'body': {}}), ['csp'])
+		self.assertEqual(get_types({'csp-report': {}}), ['legacy_csp'])
+		self.assertEqual(get_types({'date-time': '', 'hostname': ''}), ['legacy_hpkp'])
+		self.assertEqual(get_types({'type': 'unknown'}), [])
+		self.assertEqual(get_types(['not', 'a', 'report']), [])
+
+
+	def test_only_candidate_validated (self):
+		report_data = {'csp-report': {'document-uri': 'http://example.com/', 'blocked-uri': 'http://evil.com/', 'violated-directive': 'script-src'}}
+
+		report_schema_registry.shape_cache.clear()
+
+		with mock.patch.object(ReportSchema, 'is_valid', autospec=True, return_value=True) as is_valid:
+			schema = report_schema_registry.get_matching_schema(report_data)
+
+		self.assertEqual(schema.type, 'legacy_csp')
+		self.assertEqual(is_valid.call_count, 1)
+
+
+	def test_rejected_candidate_fallback (self):
+		""" When the candidates reject a report, only the schemas without discriminators are tried after them. """
+		report_data = {'type': 'csp', 'age': 0, 'url': 'https://example.com/', 'body': {}}
+
+		report_schema_registry.shape_cache.clear()
+
+		with mock.patch.object(ReportSchema, 'is_valid', autospec=True, side_effect=lambda schema, report_data: schema.fallback) as is_valid:
+			schema = report_schema_registry.get_matching_schema(report_data)
+
+		self.assertEqual(schema.type, 'misc')
+		self.assertEqual([call[0][0].type for call in is_valid.call_args_list], ['csp', 'misc'])
+
+
+
+
+class TestContentTypeHint (TestCase):
+	""" Tests that the request's content type is used to choose which schemas to try first. """
+
+	legacy_csp = {'csp-report': {'document-uri': 'http://example.com/', 'blocked-uri': 'http://evil.com/', 'violated-directive': 'script-src'}}
+	generic_csp = {'type': 'csp', 'age': 0, 'url': 'https://example.com/', 'body': {'blocked': '', 'directive': ''}}
+
+
+	def setUp (self):
+		report_schema_registry.shape_cache.clear()
+
+
+	def tearDown (self):
+		report_schema_registry.shape_cache.clear()
+
+
+	def test_hint (self):
+		with mock.patch.object(ReportSchema, 'is_valid', autospec=True, return_value=True) as is_valid:
+			schema = report_schema_registry.get_matching_schema({'unknown': {}}, content_type='application/csp-report')
+
+		self.assertEqual(schema.type, 'legacy_csp')
+		self.assertEqual(is_valid.call_count, 1)
+
+
+	def test_match (self):
+		mismatches = report_schema_registry.content_type_mismatches
+
+		self.assertEqual(report_schema_registry.get_matching_schema(self.legacy_csp, content_type='application/csp-report').type, 'legacy_csp')
+		self.assertEqual(report_schema_registry.get_matching_schema(self.generic_csp, content_type='application/reports+json').type, 'csp')
+
+		self.assertEqual(report_schema_registry.content_type_mismatches, mismatches)
+
+
+	def test_mismatch (self):
+		mismatches = report_schema_registry.content_type_mismatches
+
+		# Falls back to the other schemas and counts the mismatch
+		self.assertEqual(report_schema_registry.get_matching_schema(self.generic_csp, content_type='application/csp-report').type, 'csp')
+		self.assertEqual(report_schema_registry.content_type_mismatches, mismatches + 1)
+
+
+	def test_unknown_content_type (self):
+		mismatches = report_schema_registry.content_type_mismatches
+
+		self.assertEqual(report_schema_registry.get_matching_schema(self.legacy_csp, content_type='application/json').type, 'legacy_csp')
+		self.assertEqual(report_schema_registry.content_type_mismatches, mismatches)
+
+
+
+class TestShapeCache (TestCase):
+	""" Tests that reports with a familiar shape skip trial validation. """
+
+	def setUp (self):
+		report_schema_registry.shape_cache.clear()
+
+
+	def test_signature (self):
+		self.assertEqual(
+			shape_signature({'type': 'csp', 'body': {'b': 1, 'a': 2}}),
+			shape_signature({'body': {'a': 'x', 'b': 'y'}, 'type': 'csp'})
+		)
+		self.assertNotEqual(shape_signature({'type': 'csp'}), shape_signature({'type': 'hpkp'}))
+		self.assertNotEqual(shape_signature({'body': {'a': 1}}), shape_signature({'body': {'b': 1}}))
+		self.assertEqual(shape_signature(['list']), ('list',))
+
+
+	def test_hit (self):
+		report_data = {'type': 'nel', 'age': 0, 'url': 'https://example.com/', 'body': {}}
+		info = report_schema_registry.shape_cache.info()
+
+		self.assertEqual(report_schema_registry.get_matching_schema(report_data).type, 'misc')
+
+		# The fallback schema is the only one validated the second time
+		with mock.patch.object(ReportSchema, 'is_valid', autospec=True, return_value=True) as is_valid:
+			self.assertEqual(report_schema_registry.get_matching_schema(report_data).type, 'misc')
+
+		self.assertEqual(is_valid.call_count, 1)
+		self.assertEqual(report_schema_registry.shape_cache.info().hits, info.hits + 1)
+		self.assertEqual(report_schema_registry.shape_cache.info().misses, info.misses + 1)
+
+
+	def test_rejected_candidate_not_cached (self):
+		""" A candidate rejected because of a value may match the next report with the same shape. """
+		invalid = {'type': 'csp', 'age': 0, 'url': 'https://example.com/', 'body': {'blocked': '', 'directive': '', 'disposition': 'invalid'}}
+		valid = {'type': 'csp', 'age': 0, 'url': 'https://example.com/', 'body': {'blocked': '', 'directive': '', 'disposition': 'report'}}
+
+		self.assertEqual(report_schema_registry.get_matching_schema(invalid).type, 'misc')
+		self.assertEqual(report_schema_registry.get_matching_schema(valid).type, 'csp')
+
+
+	def test_rejected_by_value_not_cached (self):
+		""" A schema without discriminators can reject a report because of a value, so the fallback schema isn't remembered for its shape. """
+		class ValueSchema (ReportSchema):
+			class Meta:
+				abstract = True
+
+			type = 'value_test'
+			name = "Value"
+			description = "Value"
+			schema = {'type': 'object', 'required': ['kind'], 'properties': {'kind': {'enum': ['value_test']}}}
+
+		registry = ReportSchemaRegistry()
+
+		for schema in report_schema_registry.values():
+			registry[schema.type] = schema
+
+		registry.register(ValueSchema)
+
+		self.assertEqual(registry.get_matching_schema({'kind': 'other'}).type, 'misc')
+		self.assertEqual(registry.get_matching_schema({'kind': 'value_test'}).type, 'value_test')
+
+
+	def test_eviction (self):
+		cache = ShapeCache(max_size=2)
+
+		cache.set(('a',), 'a')
+		cache.set(('b',), 'b')
+		cache.get(('a',))
+		cache.set(('c',), 'c')
+
+		# The least recently used entry was evicted
+		self.assertIsNone(cache.get(('b',)))
+		self.assertEqual(cache.get(('a',)), 'a')
+		self.assertEqual(cache.info().size, 2)
+
+
+
+class TestAdaptiveOrder (TestCase):
+	""" Tests that schemas which match most often are tried first. """
+
+	def make_registry (self, adaptive: bool) -> ReportSchemaRegistry:
+		registry = ReportSchemaRegistry()
+		registry.adaptive = adaptive
+		registry.reorder_interval = 2
+
+		for schema in report_schema_registry.values():
+			registry[schema.type] = schema
+
+		return registry
+
+
+	def test_reorder (self):
+		registry = self.make_registry(adaptive=True)
+		report_data = {'date-time': '2014-04-06T13:00:50Z', 'hostname': 'www.example.com'}
+
+		for _ in range(2):
+			registry.get_matching_schema(report_data)
+
+		types = [schema.type for schema in registry.trial_order]
+
+		self.assertEqual(types[0], 'legacy_hpkp')
+		# Ties keep the registration order, and the fallback schema stays last
+		self.assertEqual(types[1:], [schema.type for schema in report_schema_registry.values() if schema.type != 'legacy_hpkp'])
+		self.assertEqual(types[-1], 'misc')
+
+
+	def test_fallback_pinned (self):
+		registry = self.make_registry(adaptive=True)
+
+		for _ in range(4):
+			registry.get_matching_schema({'type': 'nel'})
+
+		self.assertEqual(registry.trial_order[-1].type, 'misc')
+
+
+	def test_disabled (self):
+		registry = self.make_registry(adaptive=False)
+
+		for _ in range(4):
+			registry.get_matching_schema({'date-time': '2014-04-06T13:00:50Z', 'hostname': 'www.example.com'})
+
+		self.assertEqual(registry.trial_order, list(report_schema_registry.values()))
+
+
+
+class TestCodegenEngine (TestCase):
+	""" Tests that compiled validators give the same results as ``jsonschema``. """
+
+	edge_cases = [
+		None, True, 0, 'string', [], {},
+		{'type': 'csp', 'age': True, 'url': 'https://example.com/', 'body': {'blocked': '', 'directive': ''}},
+		{'type': 'csp', 'age': 1.0, 'url': 'https://example.com/', 'body': {'blocked': '', 'directive': ''}},
+		{'type': 'csp', 'age': 1, 'url': 'https://example.com/', 'body': {'blocked': '', 'directive': '', 'disposition': 'other'}},
+		{'type': 'csp', 'age': 1, 'url': 'https://example.com/', 'body': {'blocked': ''}},
+		{'type': 'hpkp', 'age': 1, 'url': 'https://example.com/', 'body': {'hostname': 'example.com', 'served-certificate-chain': []}},
+		{'type': 'hpkp', 'age': 1, 'url': 'https://example.com/', 'body': {'hostname': 'example.com', 'known-pins': ['pin-sha256="abc"', 'nope']}},
+		{'hostname': 'example.com', 'port': '443'},
+		{'hostname': 1},
+	]
+
+
+	def get_reports (self):
+		reports = list(self.edge_cases)
+
+		for fixture_file in Path(apps.get_app_config('lookout').path, 'fixtures', 'report_tests').glob('*.json'):
+			report_datum = json.loads(fixture_file.read_text())
+			reports.extend(report_datum if isinstance(report_datum, list) else [report_datum])
+
+		return reports
+
+
+	def test_equivalence (self):
+		for schema in report_schema_registry.values():
+			reference = schema_engines['jsonschema'](schema.schema)
+			compiled = compile_schema(schema.schema)
+
+			for report_data in self.get_reports():
+				with self.subTest(schema=schema.type, report=report_data):
+					self.assertEqual(compiled(report_data), reference(report_data))
+
+
+	def test_combinators (self):
+		schema = {
+			'type': 'object',
+			'additionalProperties': False,
+			'properties': {
+				'a': {'oneOf': [{'type': 'integer'}, {'minimum': 2}]},
+				'b': {'not': {'type': 'string'}},
+				'c': {'type': 'array', 'items': [{'type': 'string'}, {'type': 'null'}], 'maxItems': 2},
+				'd': {'allOf': [{'type': 'string', 'minLength': 2}, {'maxLength': 3}]}
+			}
+		}
+		reference = schema_engines['jsonschema'](schema)
+		compiled = compile_schema(schema)
+
+		for data in [{}, {'a': 1}, {'a': 3}, {'a': 2.5}, {'b': 'x'}, {'b': 1}, {'c': ['x', None]}, {'c': ['x', 1]}, {'c': [1, 2, 3]}, {'d': 'a'}, {'d': 'abcd'}, {'d': 'abc'}, {'e': 1}]:
+			with self.subTest(data=data):
+				self.assertEqual(compiled(data), reference(data))
+
+
+	def test_unsupported (self):
+		with self.assertRaises(UnsupportedSchemaError):
+			compile_schema({'type': 'array', 'uniqueItems': True})
+
+		# The engine falls back to jsonschema
+		validate = schema_engines['codegen']({'type': 'array', 'uniqueItems': True})
+		self.assertFalse(validate([1, 1]))
+
+
+	def test_set_engine (self):
+		try:
+			report_schema_registry.set_engine('codegen')
+
+			for schema in report_schema_registry.values():
+				self.assertTrue(hasattr(schema.validator, 'source'))
+
+				# Matching the fixtures gives the same results
+				for report_data in self.get_reports():
+					self.assertEqual(schema.is_valid(report_data), schema_engines['jsonschema'](schema.schema)(report_data))
+
+		finally:
+			report_schema_registry.set_engine('jsonschema')
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.core.management import call_command, CommandError
+from django.db.models import Sum
+from django.test import TestCase
+
+from .base import csp_report
+from lookout.models import Report, MinuteRollup, HourRollup, DayRollup
+from lookout.utils import truncate_time
+
+
+
+class RollupTestCase (TestCase):
+	""" Tests counting reports per period. """
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+
+
+	def save (self, report_datum: list) -> list:
+		with mock.patch.object(self.config, 'ROLLUP_PERIODS', ('minute', 'hour', 'day')):
+			return Report.objects.save_batch(list(Report.objects.build_from_data(report_datum)))
+
+
+	def test_ingest (self):
+		# Two reports from over an hour ago
+		reports = self.save([csp_report(), csp_report(), csp_report('style-src'), csp_report(age=2 * 3600 * 1000), csp_report(age=2 * 3600 * 1000 + 1)])
+
+		self.save([csp_report()])
+
+		rollup = HourRollup.objects.get(period_start=truncate_time(reports[0].incident_time, 'hour'), directive='script-src')
+		self.assertEqual(rollup.count, 3)
+		self.assertEqual((rollup.type, rollup.blocked_origin, rollup.document_host), ('csp', 'https://evil.com', 'example.com'))
+
+		self.assertEqual(HourRollup.objects.filter(directive='style-src').get().count, 1)
+		self.assertEqual(HourRollup.objects.aggregate(total=Sum('count'))['total'], 6)
+		self.assertEqual(MinuteRollup.objects.aggregate(total=Sum('count'))['total'], 6)
+		self.assertEqual(DayRollup.objects.aggregate(total=Sum('count'))['total'], 6)
+
+
+	def test_disabled (self):
+		Report.objects.save_batch(list(Report.objects.build_from_data([csp_report()])))
+		self.assertFalse(HourRollup.objects.exists())
+
+
+	def test_recount (self):
+		Report.objects.all().delete()
+		self.save([csp_report(), csp_report(), csp_report('style-src')])
+		expected = sorted(HourRollup.objects.values_list('key', 'period_start', 'directive', 'count'))
+
+		# Saved without rollups
+		Report.objects.save_batch(list(Report.objects.build_from_data([csp_report()])))
+
+		out = StringIO()
+		call_command('lookout_rollup', '--period=hour', stdout=out)
+
+		self.assertIn("Counted 2 hour rollups.", out.getvalue())
+
+		# The keys match the ones created at ingest
+		recounted = sorted(HourRollup.objects.values_list('key', 'period_start', 'directive', 'count'))
+		self.assertEqual([row[:3] for row in recounted], [row[:3] for row in expected])
+		self.assertEqual(HourRollup.objects.aggregate(total=Sum('count'))['total'], 4)
+
+		# Other periods are left alone
+		self.assertEqual(MinuteRollup.objects.aggregate(total=Sum('count'))['total'], 3)
+
+
+	def test_recount_keeps_counts (self):
+		Report.objects.all().delete()
+		self.save([csp_report(), csp_report()])
+
+		# Reports which have been deleted are still counted
+		Report.objects.first().delete()
+		call_command('lookout_rollup', '--period=hour', stdout=StringIO())
+
+		self.assertEqual(HourRollup.objects.get().count, 2)
+
+
+	def test_recount_aggregated (self):
+		with mock.patch.object(self.config, 'AGGREGATE_REPORTS', True), self.assertRaisesMessage(CommandError, "AGGREGATE_REPORTS"):
+			call_command('lookout_rollup', stdout=StringIO())
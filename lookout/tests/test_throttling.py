@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import caches
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from .base import csp_report, csp_report_json
+from lookout.models import Report
+from lookout.report_schemas import CSPReportSchema
+from lookout.throttling import report_throttle, client_throttle
+
+
+
+class ReportThrottleTestCase (TestCase):
+	""" Tests sampling and rate limiting of incoming reports. """
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+		caches[self.config.THROTTLE_CACHE].clear()
+
+
+	def build (self, report_datum: list) -> list:
+		return list(Report.objects.build_from_data(report_datum, throttle=True))
+
+
+	def test_throttle_key (self):
+		self.assertEqual(CSPReportSchema.throttle_key(csp_report()), ('script-src', 'evil.com'))
+		self.assertEqual(CSPReportSchema.throttle_key(csp_report("script-src 'self'", 'inline')), ('script-src', 'inline'))
+
+
+	def test_token_bucket (self):
+		# A burst of up to the bucket's size is allowed
+		self.assertEqual([report_throttle.take_token(('test',), 2, 10, now=100) for _ in range(3)], [True, True, False])
+
+		# Tokens are refilled over the period
+		self.assertTrue(report_throttle.take_token(('test',), 2, 10, now=105))
+		self.assertFalse(report_throttle.take_token(('test',), 2, 10, now=105))
+		self.assertTrue(report_throttle.take_token(('test',), 2, 10, now=120))
+
+
+	def test_rate_limits (self):
+		report_datum = [csp_report()] * 3 + [csp_report(directive='style-src')] + [csp_report(blocked='https://other.com/')]
+
+		with mock.patch.object(self.config, 'RATE_LIMITS', {'csp': (2, 60)}):
+			self.assertEqual(len(self.build(report_datum)), 4)
+
+		self.assertEqual(report_throttle.dropped_counts('csp'), {'sampled': 0, 'throttled': 1})
+
+		# The limit only applies to ingestion
+		self.assertEqual(len(list(Report.objects.build_from_data(report_datum))), 5)
+
+
+	def test_sample_rates (self):
+		with mock.patch.object(self.config, 'SAMPLE_RATES', {'csp': 0.5}), mock.patch('random.random', side_effect=[0.2, 0.7, 0.4, 0.9]):
+			self.assertEqual(len(self.build([csp_report()] * 4)), 2)
+
+		self.assertEqual(report_throttle.dropped_counts('csp'), {'sampled': 2, 'throttled': 0})
+
+		report_throttle.reset_dropped_counts('csp')
+		self.assertEqual(report_throttle.dropped_counts('csp'), {'sampled': 0, 'throttled': 0})
+
+
+
+class ClientThrottleTestCase (TestCase):
+	""" Tests the per-client limit on requests. """
+
+	def setUp (self):
+		self.config = apps.get_app_config('lookout')
+		caches[self.config.THROTTLE_CACHE].clear()
+
+
+	def test_ident (self):
+		factory = RequestFactory()
+
+		for meta, num_proxies, ident in [
+			({'REMOTE_ADDR': '10.0.0.1'}, 0, '10.0.0.1'),
+			({'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '1.1.1.1, 2.2.2.2'}, 0, '10.0.0.1'),
+			({'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '1.1.1.1, 2.2.2.2'}, 1, '2.2.2.2'),
+			({'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '1.1.1.1, 2.2.2.2'}, 5, '1.1.1.1'),
+			({'REMOTE_ADDR': '2001:db8::1'}, 0, '2001:db8::/64'),
+		]:
+			with self.subTest(meta=meta, num_proxies=num_proxies), mock.patch.object(self.config, 'CLIENT_NUM_PROXIES', num_proxies):
+				self.assertEqual(client_throttle.get_ident(factory.post('/', **meta)), ident)
+
+
+	def test_sliding_window (self):
+		request = RequestFactory().post('/')
+
+		with mock.patch.object(self.config, 'CLIENT_RATE_LIMIT', (2, 10)):
+			self.assertEqual([client_throttle.allow(request, now=1000 + i) for i in range(3)], [True, True, False])
+
+			# Three requests in the previous window, weighted by its overlap with the sliding window: 3 * 0.5 + 1
+			self.assertFalse(client_throttle.allow(request, now=1015))
+
+			# One request in the previous window: 1 * 0.1 + 1
+			self.assertTrue(client_throttle.allow(request, now=1029))
+
+
+	def test_endpoint (self):
+		client = Client()
+		report_json = csp_report_json()
+
+		with mock.patch.object(self.config, 'CLIENT_RATE_LIMIT', (1, 60)), mock.patch('lookout.views.json_loads') as json_loads:
+			json_loads.return_value = []
+
+			self.assertEqual(client.post(reverse('lookout:http-report'), data=report_json, content_type='application/json').status_code, 200)
+
+			response = client.post(reverse('lookout:http-report'), data=report_json, content_type='application/json')
+			self.assertEqual(response.status_code, 429)
+			self.assertEqual(response['Retry-After'], '60')
+
+			# Rejected before the body is decoded
+			self.assertEqual(json_loads.call_count, 1)
@@ -0,0 +1,123 @@
+import json
+import math
+
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import TestCase
+
+from lookout.exceptions import JSONDecodeError
+from lookout.utils import json_backends, get_json_backend, uuid7
+
+
+
+class TestJSONBackends (TestCase):
+	""" Tests that every installed JSON backend behaves the same way. """
+
+	data = {'type': 'csp', 'url': 'https://example.com/', 'body': {'b': 1, 'a': ['é', None, True, 1.5]}}
+
+
+	def get_backends (self):
+		for name in json_backends:
+			try:
+				yield get_json_backend(name)
+			except ImportError:
+				continue
+
+
+	def test_round_trip (self):
+		for backend in self.get_backends():
+			with self.subTest(backend=backend.name):
+				self.assertEqual(backend.loads(backend.dumps(self.data)), self.data)
+				self.assertEqual(backend.loads(backend.dumps(self.data).encode('utf8')), self.data)
+
+
+	def test_pretty (self):
+		for backend in self.get_backends():
+			with self.subTest(backend=backend.name):
+				pretty = backend.dumps(self.data, pretty=True)
+
+				self.assertEqual(backend.loads(pretty), self.data)
+
+				# Indented with sorted keys
+				self.assertTrue(pretty.startswith('{\n  "body": {\n    "a": ['))
+
+
+	def test_decode_errors (self):
+		for backend in self.get_backends():
+			for data in ['{', b'\xff\xfe{}', '']:
+				with self.subTest(backend=backend.name, data=data):
+					with self.assertRaises(JSONDecodeError):
+						backend.loads(data)
+
+
+	def test_standard_library_compatibility (self):
+		""" Documents which the standard library handles aren't rejected by the faster backends. """
+
+		for backend in self.get_backends():
+			for data in ['{"a": 1e400}', '{"a": "\\ud800"}', '[Infinity]']:
+				with self.subTest(backend=backend.name, data=data):
+					self.assertEqual(backend.loads(data), json.loads(data))
+
+			for obj in [{'status': 123456789012345678901234567890}, {'a': '\ud800'}]:
+				with self.subTest(backend=backend.name, obj=obj):
+					self.assertEqual(json.loads(backend.dumps(obj)), obj)
+
+
+	def test_orjson_fallback (self):
+		""" Only the documents which the standard library might accept are decoded again after orjson rejects them. """
+
+		try:
+			backend = get_json_backend('orjson')
+		except ImportError:
+			self.skipTest("orjson isn't installed")
+
+		stdlib = get_json_backend('stdlib')
+
+		with mock.patch.object(stdlib, 'loads', wraps=stdlib.loads) as loads:
+			for data in ['{', b'{"a": [1, 2', 'junk']:
+				with self.subTest(data=data), self.assertRaises(JSONDecodeError):
+					backend.loads(data)
+
+			loads.assert_not_called()
+
+			self.assertTrue(math.isnan(backend.loads(b'[NaN]')[0]))
+			loads.assert_called_once_with(b'[NaN]')
+
+
+	def test_default (self):
+		# The faster backends are opt-in
+		self.assertEqual(get_json_backend().name, 'stdlib')
+
+
+	def test_auto (self):
+		self.assertIn(get_json_backend('auto').name, json_backends)
+
+
+	def test_unknown (self):
+		with self.assertRaises(ValueError):
+			get_json_backend('nonsense')
+
+
+
+class TestUUID7 (TestCase):
+	""" Tests time-ordered UUIDs. """
+
+	def test_format (self):
+		timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+		value = uuid7(timestamp)
+
+		self.assertEqual(value.version, 7)
+		self.assertEqual(value.variant, 'specified in RFC 4122')
+		self.assertEqual(int(value.hex[:12], 16), timestamp.timestamp() * 1000)
+
+
+	def test_ordering (self):
+		timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+		values = [uuid7(timestamp + timedelta(milliseconds=i)) for i in range(100)]
+
+		self.assertEqual(sorted(values), values)
+		self.assertEqual(sorted(str(value) for value in values), [str(value) for value in values])
+
+		# UUIDs from the same millisecond are still unique
+		self.assertEqual(len({uuid7(timestamp) for _ in range(100)}), 100)
@@ -1,6 +1,12 @@
-from django.conf.urls import include, url
+from django.conf.urls import include
+
+try:
+	from django.urls import re_path
+except ImportError:
+	# Django < 2.0
+	from django.conf.urls import url as re_path
 
 
 urlpatterns = [
-	url(r'^report', include('lookout.urls')),
+	re_path(r'^report', include('lookout.urls')),
 ]
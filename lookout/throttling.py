@@ -0,0 +1,186 @@
+import hashlib
+import ipaddress
+import logging
+import math
+import random
+import time
+import typing
+
+from django.apps import apps
+from django.core.cache import caches
+from django.http import HttpRequest
+
+
+__all__ = ['ReportThrottle', 'ClientThrottle', 'report_throttle', 'client_throttle']
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class ReportThrottle:
+	"""
+	Samples and rate limits incoming reports, counting the ones which are dropped so that the real volume can be estimated.
+
+	Rate limits are token buckets, kept in the ``THROTTLE_CACHE`` so that they're shared by every process using that cache.
+	Each bucket is stored as a single timestamp using the generic cell rate algorithm.
+	Concurrent requests can race to update the same bucket, which lets a few more reports through than the limit allows.
+	"""
+
+	key_prefix = 'lookout:throttle'
+
+	reasons = ('sampled', 'throttled')
+	""" Why reports are dropped. """
+
+
+	@property
+	def cache (self):
+		return caches[apps.get_app_config('lookout').THROTTLE_CACHE]
+
+
+	def allow (self, schema, report_data: dict) -> bool:
+		""" Whether a normalized report should be kept. """
+
+		config = apps.get_app_config('lookout')
+		report_type = schema.type
+
+		sample_rate = config.SAMPLE_RATES.get(report_type)
+		if sample_rate is not None and random.random() >= sample_rate:
+			self.record_drop(report_type, 'sampled')
+			return False
+
+		rate_limit = config.RATE_LIMITS.get(report_type)
+		if rate_limit is not None:
+			count, period = rate_limit
+
+			if not self.take_token((report_type,) + tuple(schema.throttle_key(report_data)), count, period):
+				self.record_drop(report_type, 'throttled')
+				return False
+
+		return True
+
+
+	def take_token (self, key: tuple, count: int, period: float, now: typing.Optional[float] = None) -> bool:
+		""" Takes a token from the bucket for ``key``, which holds up to ``count`` tokens and refills them over ``period`` seconds. """
+
+		if now is None:
+			now = time.time()
+
+		cache_key = '{}:bucket:{}'.format(self.key_prefix, hashlib.md5(repr(key).encode('utf8')).hexdigest())
+
+		# The time at which the bucket will be full again
+		interval = period / count
+		full_time = max(self.cache.get(cache_key, now), now)
+
+		if full_time - now > period - interval:
+			return False
+
+		full_time += interval
+		self.cache.set(cache_key, full_time, timeout=math.ceil(full_time - now))
+
+		return True
+
+
+	def record_drop (self, report_type: str, reason: str, count: int = 1):
+		cache_key = self.drop_key(report_type, reason)
+
+		self.cache.add(cache_key, 0, timeout=None)
+
+		try:
+			self.cache.incr(cache_key, count)
+		except ValueError:
+			# Evicted since it was added
+			self.cache.add(cache_key, count, timeout=None)
+
+		logger.debug("Dropped a {!r} report ({}).".format(report_type, reason))
+
+
+	def drop_key (self, report_type: str, reason: str) -> str:
+		return '{}:dropped:{}:{}'.format(self.key_prefix, reason, report_type)
+
+
+	def dropped_counts (self, report_type: str) -> typing.Dict[str, int]:
+		""" Returns the number of reports of a type which have been dropped for each reason. """
+
+		keys = {reason: self.drop_key(report_type, reason) for reason in self.reasons}
+		counts = self.cache.get_many(keys.values())
+
+		return {reason: counts.get(key, 0) for reason, key in keys.items()}
+
+
+	def reset_dropped_counts (self, report_type: str):
+		self.cache.delete_many([self.drop_key(report_type, reason) for reason in self.reasons])
+
+
+
+class ClientThrottle:
+	"""
+	Limits the number of requests from each client, using the ``CLIENT_RATE_LIMIT`` setting.
+
+	Requests are counted in fixed windows in the ``THROTTLE_CACHE``, and the rate is estimated over a sliding window
+	by weighting the previous window's count by how much of it overlaps. Rejected requests are counted too, so clients need to back off.
+	"""
+
+	key_prefix = 'lookout:client'
+
+
+	@property
+	def cache (self):
+		return caches[apps.get_app_config('lookout').THROTTLE_CACHE]
+
+
+	def get_ident (self, request: HttpRequest) -> str:
+		""" Identifies the client by its IP address, taking ``X-Forwarded-For`` into account behind ``CLIENT_NUM_PROXIES`` proxies. """
+
+		num_proxies = apps.get_app_config('lookout').CLIENT_NUM_PROXIES
+		address = request.META.get('REMOTE_ADDR', '')
+
+		forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+		if num_proxies and forwarded_for:
+			# Each proxy appends the address it received the request from, so only the last ones can be trusted
+			addresses = [address.strip() for address in forwarded_for.split(',')]
+			address = addresses[-min(num_proxies, len(addresses))]
+
+		try:
+			ip_address = ipaddress.ip_address(address)
+		except ValueError:
+			return address
+
+		# IPv6 clients can easily use any address in their subnet
+		if ip_address.version == 6:
+			return str(ipaddress.ip_network('{}/64'.format(ip_address), strict=False))
+
+		return str(ip_address)
+
+
+	def allow (self, request: HttpRequest, now: typing.Optional[float] = None) -> bool:
+		""" Counts a request, returning whether the client is within its limit. """
+
+		count, period = apps.get_app_config('lookout').CLIENT_RATE_LIMIT
+
+		if now is None:
+			now = time.time()
+
+		window, position = divmod(now, period)
+		ident = hashlib.md5(self.get_ident(request).encode('utf8')).hexdigest()
+
+		current_key = '{}:{}:{}'.format(self.key_prefix, ident, int(window))
+		previous_key = '{}:{}:{}'.format(self.key_prefix, ident, int(window) - 1)
+
+		self.cache.add(current_key, 0, timeout=math.ceil(period * 2))
+
+		try:
+			current = self.cache.incr(current_key)
+		except ValueError:
+			# Evicted since it was added
+			current = 1
+			self.cache.add(current_key, current, timeout=math.ceil(period * 2))
+
+		previous = self.cache.get(previous_key, 0)
+
+		return previous * (1 - position / period) + current <= count
+
+
+
+report_throttle = ReportThrottle()
+client_throttle = ClientThrottle()
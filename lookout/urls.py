@@ -8,17 +8,21 @@ Add the endpoint to your ``urls.py`` like so:
 	urlpatterns = [
 		...
 		# Django Lookout
-		url(r'^reporting', include('lookout.urls')),
+		re_path(r'^reporting', include('lookout.urls')),
 		...
 	]
 """
 
-from django.conf.urls import url
+try:
+	from django.urls import re_path
+except ImportError:
+	# Django < 2.0
+	from django.conf.urls import url as re_path
 
 from .views import ReportView
 
 
 app_name = 'lookout'
 urlpatterns = [
-	url(r'^$', ReportView.as_view(), name='http-report'),
+	re_path(r'^$', ReportView.as_view(), name='http-report'),
 ]
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import typing
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from urllib.parse import urlsplit
+
+from django.apps import apps
+
+from .exceptions import JSONDecodeError
+
+
+__all__ = ['JSONBackend', 'json_backends', 'get_json_backend', 'json_loads', 'json_dumps', 'chunked', 'url_hostname', 'url_origin', 'fingerprint']
+
+
+
+class JSONBackend:
+	""" Wraps a JSON library so that it can be used interchangeably with the others. """
+
+	name = None
+
+
+	def loads (self, data: typing.Union[str, bytes]):
+		""" Decodes a JSON document. Raises ``lookout.exceptions.JSONDecodeError`` if it's invalid. """
+		raise NotImplementedError()
+
+
+	def dumps (self, obj, pretty: bool = False) -> str:
+		""" Encodes an object as JSON. ``pretty`` adds indentation and sorts the keys. """
+		raise NotImplementedError()
+
+
+
+class StdlibBackend (JSONBackend):
+	""" Python's built-in ``json`` module. """
+
+	name = 'stdlib'
+
+
+	def loads (self, data):
+		try:
+			# Python 3.5 can't decode bytes directly
+			if isinstance(data, bytes) and sys.version_info < (3, 6):
+				data = data.decode('utf8')
+
+			return json.loads(data)
+
+		except UnicodeDecodeError as e:
+			raise JSONDecodeError(str(e), '', 0)
+
+
+	def dumps (self, obj, pretty=False):
+		if pretty:
+			return json.dumps(obj, sort_keys=True, indent=2)
+
+		return json.dumps(obj)
+
+
+
+class OrjsonBackend (JSONBackend):
+	""" `orjson <https://github.com/ijl/orjson>`_ """
+
+	name = 'orjson'
+
+	stdlib_only = r'NaN|Infinity|[eE][-+]?\d{3}|\\u[dD][89a-fA-F]'
+	""" Matches the tokens of documents which orjson rejects but the standard library accepts: NaN, infinite numbers like 1e400, and surrogate escapes. """
+
+
+	def __init__ (self):
+		import orjson
+		self.orjson = orjson
+
+		self.stdlib_only_patterns = {str: re.compile(self.stdlib_only), bytes: re.compile(self.stdlib_only.encode('ascii'))}
+
+
+	def loads (self, data):
+		try:
+			return self.orjson.loads(data)
+		except self.orjson.JSONDecodeError:
+			# Documents which the standard library would reject too aren't decoded twice
+			if not self.stdlib_only_patterns[type(data)].search(data):
+				raise
+
+			return get_json_backend('stdlib').loads(data)
+
+
+	def dumps (self, obj, pretty=False):
+		try:
+			if pretty:
+				return self.orjson.dumps(obj, option=self.orjson.OPT_INDENT_2 | self.orjson.OPT_SORT_KEYS).decode('utf8')
+
+			return self.orjson.dumps(obj).decode('utf8')
+
+		except TypeError:
+			# Integers wider than 64 bits and lone surrogates can't be encoded by orjson
+			return get_json_backend('stdlib').dumps(obj, pretty=pretty)
+
+
+
+class UjsonBackend (JSONBackend):
+	""" `UltraJSON <https://github.com/ultrajson/ultrajson>`_ """
+
+	name = 'ujson'
+
+
+	def __init__ (self):
+		import ujson
+		self.ujson = ujson
+
+
+	def loads (self, data):
+		try:
+			return self.ujson.loads(data)
+		except ValueError as e:
+			raise JSONDecodeError(str(e), '', 0)
+
+
+	def dumps (self, obj, pretty=False):
+		if pretty:
+			return self.ujson.dumps(obj, escape_forward_slashes=False, sort_keys=True, indent=2)
+
+		return self.ujson.dumps(obj, escape_forward_slashes=False)
+
+
+
+json_backends = OrderedDict((backend.name, backend) for backend in [OrjsonBackend, UjsonBackend, StdlibBackend])
+""" Available JSON backends, in the order they're preferred by ``'auto'``. """
+
+
+_backend_instances = {}
+
+
+def get_json_backend (name: typing.Optional[str] = None) -> JSONBackend:
+	"""
+	Returns an instance of the named JSON backend, or the one chosen with the ``JSON_BACKEND`` setting.
+	``'auto'`` uses the fastest library that's installed.
+	"""
+
+	if name is None:
+		name = apps.get_app_config('lookout').JSON_BACKEND
+
+	try:
+		return _backend_instances[name]
+	except KeyError:
+		pass
+
+	if name == 'auto':
+		for backend_class in json_backends.values():
+			try:
+				backend = backend_class()
+			except ImportError:
+				continue
+			else:
+				break
+	else:
+		try:
+			backend_class = json_backends[name]
+		except KeyError:
+			raise ValueError("Unknown JSON backend {!r}.".format(name))
+
+		backend = backend_class()
+
+	_backend_instances[name] = backend
+
+	return backend
+
+
+def json_loads (data: typing.Union[str, bytes]):
+	""" Decodes JSON using the configured backend. """
+	return get_json_backend().loads(data)
+
+
+def json_dumps (obj, pretty: bool = False) -> str:
+	""" Encodes JSON using the configured backend. """
+	return get_json_backend().dumps(obj, pretty=pretty)
+
+
+def chunked (iterable: typing.Iterable, size: typing.Optional[int]) -> typing.Iterator[list]:
+	""" Splits an iterable into lists of up to ``size`` items. ``None`` puts everything in one list. """
+
+	if size is None:
+		items = list(iterable)
+		if items:
+			yield items
+		return
+
+	iterator = iter(iterable)
+
+	while True:
+		chunk = list(islice(iterator, size))
+		if not chunk:
+			return
+		yield chunk
+
+
+def url_hostname (url: typing.Optional[str]) -> typing.Optional[str]:
+	""" Returns the hostname of a URL, or the value itself if it isn't a URL, like CSP's ``'inline'`` and ``'eval'``. """
+
+	if not url:
+		return None
+
+	try:
+		return urlsplit(url).hostname or url
+	except ValueError:
+		return url
+
+
+def url_origin (url: typing.Optional[str]) -> typing.Optional[str]:
+	""" Returns the scheme, host and port of a URL, or the value itself if it isn't a URL. """
+
+	if not url:
+		return None
+
+	try:
+		parts = urlsplit(url)
+	except ValueError:
+		return url
+
+	if not parts.scheme or not parts.netloc:
+		return url
+
+	# Leave out any credentials
+	return '{}://{}'.format(parts.scheme, parts.netloc.rpartition('@')[2])
+
+
+def fingerprint (values: typing.Iterable) -> str:
+	""" Hashes JSON-compatible values into a short identifier, which is the same regardless of the order of dictionary keys. """
+
+	canonical = json.dumps(list(values), sort_keys=True, separators=(',', ':'), default=str)
+	return hashlib.sha1(canonical.encode('utf8')).hexdigest()
+
+
+def truncate_time (moment: datetime, period: str) -> datetime:
+	""" Returns the start of the ``'minute'``, ``'hour'``, ``'day'``, ``'week'`` (starting on Monday), or ``'month'`` containing ``moment``, in UTC. """
+
+	start = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+
+	if period == 'minute':
+		return start
+
+	start = start.replace(minute=0)
+
+	if period == 'hour':
+		return start
+
+	start = start.replace(hour=0)
+
+	if period == 'week':
+		return start - timedelta(days=start.weekday())
+	elif period == 'month':
+		return start.replace(day=1)
+
+	return start
+
+
+def uuid7 (timestamp: typing.Optional[datetime] = None) -> uuid.UUID:
+	"""
+	Creates a version 7 UUID, which starts with the number of milliseconds since the Unix epoch and ends with random bits.
+	UUIDs created later sort after earlier ones, so new rows are added to the end of a primary key index rather than all over it.
+	"""
+
+	seconds = timestamp.timestamp() if timestamp is not None else time.time()
+	milliseconds = int(seconds * 1000) & 0xFFFFFFFFFFFF
+
+	# Clear the bits used for the version and variant
+	random_bits = int.from_bytes(os.urandom(10), 'big') & ~(0xF << 76 | 0x3 << 62)
+
+	return uuid.UUID(int=milliseconds << 80 | 0x7 << 76 | 0x2 << 62 | random_bits)
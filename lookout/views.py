@@ -1,21 +1,36 @@
 import logging
+import math
+import re
+import typing
 
+import django
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpResponse, HttpResponseBadRequest, HttpRequest
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
 from .models import Report
+from .buffer import get_report_buffer
+from .backpressure import ingest_monitor
 from .logging import ReportMessage
-from .exceptions import JSONDecodeError, UnknownSchemaError
+from .parsing import iter_reports, DecompressingStream
+from .throttling import client_throttle
+from .utils import json_loads, chunked
+from .exceptions import JSONDecodeError, UnknownSchemaError, RequestTooLargeError, ContentEncodingError, UnsupportedContentEncodingError
 
 
-__all__ = ['ReportView']
+__all__ = ['ReportView', 'AsyncReportView']
 
 
 logger = logging.getLogger('lookout')
 
 
+JSON_START = re.compile(rb'[ \t\n\r]*[\[{]')
+""" Matches the start of a body containing a report or an array of reports. """
+
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ReportView (View):
@@ -24,22 +39,226 @@ class ReportView (View):
 	http_method_names = ['post']
 
 
-	@staticmethod
-	def post(request: HttpRequest) -> HttpResponse:
+	def post (self, request: HttpRequest) -> HttpResponse:
 		""" Handles the POST request. """
 
+		config = apps.get_app_config('lookout')
+
+		rejection = self.reject_request(request)
+		if rejection is not None:
+			return rejection
+
 		try:
-			reports = Report.objects.create_from_json(request.body.decode('utf8'))
+			reports = Report.objects.build_from_data(self.get_report_data(request), content_type=request.content_type, throttle=True)
+
+			if config.BUFFER_REPORTS:
+				reports = list(reports)
+
+				# Queue the reports to be saved in the background, or save them now if the buffer is full
+				overflow = get_report_buffer().put(reports)
+				if overflow:
+					Report.objects.save_batch(overflow)
+
+				self.log_reports(reports)
+
+			elif config.STREAM_REPORTS:
+				# Save the reports in batches as they're decoded, each in its own transaction, so a slow client doesn't hold one open
+				for batch in chunked(reports, config.BATCH_SIZE):
+					Report.objects.save_batch(batch)
+					self.log_reports(batch)
+
+			else:
+				# Make sure all of the reports are valid before saving any of them
+				reports = Report.objects.save_batch(list(reports))
 
-			# Log the reports
-			for report in reports:
-				logger.error(ReportMessage(report=report))
+				self.log_reports(reports)
 
-		except JSONDecodeError:
+		except (JSONDecodeError, UnknownSchemaError, RequestTooLargeError, ContentEncodingError) as e:
+			return self.error_response(e)
+
+		# Return an empty HTTP 200
+		return HttpResponse('')
+
+
+	@staticmethod
+	def error_response (error: Exception) -> HttpResponse:
+		""" Creates the response for a request which couldn't be processed. """
+
+		if isinstance(error, JSONDecodeError):
 			return HttpResponseBadRequest("Request body was not valid JSON.")
 
-		except UnknownSchemaError:
+		if isinstance(error, UnknownSchemaError):
 			return HttpResponseBadRequest("Request body didn't match any known schema.")
 
+		if isinstance(error, RequestTooLargeError):
+			return HttpResponse(str(error), status=413)
+
+		if isinstance(error, UnsupportedContentEncodingError):
+			return HttpResponse(str(error), status=415)
+
+		return HttpResponseBadRequest(str(error))
+
+
+	@staticmethod
+	def reject_request (request: HttpRequest) -> typing.Optional[HttpResponse]:
+		""" Checks the request's headers and the server's load, returning an error response if the request shouldn't be processed. """
+
+		config = apps.get_app_config('lookout')
+
+		# Requests without a content type fall through to the check on the body
+		if config.ALLOWED_CONTENT_TYPES is not None and request.content_type and request.content_type not in config.ALLOWED_CONTENT_TYPES:
+			return HttpResponse("Unsupported content type.", status=415)
+
+		try:
+			content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+		except ValueError:
+			return HttpResponseBadRequest("Invalid Content-Length.")
+
+		if config.MAX_BODY_SIZE is not None and content_length > config.MAX_BODY_SIZE:
+			return HttpResponse("The request body is larger than {} bytes.".format(config.MAX_BODY_SIZE), status=413)
+
+		# Contain clients which send too many requests
+		if config.CLIENT_RATE_LIMIT is not None and not client_throttle.allow(request):
+			response = HttpResponse('', status=429)
+			response['Retry-After'] = str(math.ceil(config.CLIENT_RATE_LIMIT[1]))
+			return response
+
+		# Shed load while the database can't keep up. Browsers will resend the reports later.
+		if ingest_monitor.is_saturated():
+			response = HttpResponse('', status=503)
+			response['Retry-After'] = str(config.RETRY_AFTER)
+			return response
+
+		return None
+
+
+	@staticmethod
+	def get_report_data (request: HttpRequest) -> typing.Iterable:
+		""" Decodes the reports in the request body, enforcing the configured size limits. """
+
+		config = apps.get_app_config('lookout')
+		encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+
+		if encoding and encoding != 'identity':
+			# Decompress the body as it's read. The parser's limit applies to the decompressed body.
+			stream = DecompressingStream(
+				request, encoding,
+				max_input=config.MAX_BODY_SIZE, max_output=config.MAX_DECOMPRESSED_SIZE, max_ratio=config.MAX_COMPRESSION_RATIO
+			)
+			max_bytes = config.MAX_DECOMPRESSED_SIZE
+		else:
+			stream = None
+			max_bytes = config.MAX_BODY_SIZE
+
+		# Decode one report at a time from the request stream
+		if config.STREAM_REPORTS:
+			return iter_reports(stream or request, max_bytes=max_bytes, max_reports=config.MAX_REPORTS_PER_REQUEST)
+
+		if stream is not None:
+			body = stream.read()
+		else:
+			body = request.body
+
+			if config.MAX_BODY_SIZE is not None and len(body) > config.MAX_BODY_SIZE:
+				raise RequestTooLargeError("The request body is larger than {} bytes.".format(config.MAX_BODY_SIZE))
+
+		# Reject bodies which can't contain reports without decoding them
+		if not JSON_START.match(body):
+			raise JSONDecodeError("Expecting an object or array", '', 0)
+
+		report_datum = json_loads(body)
+
+		# Wrap single reports in a list
+		if not isinstance(report_datum, list):
+			report_datum = [report_datum]
+
+		if config.MAX_REPORTS_PER_REQUEST is not None and len(report_datum) > config.MAX_REPORTS_PER_REQUEST:
+			raise RequestTooLargeError("The request contains more than {} reports.".format(config.MAX_REPORTS_PER_REQUEST))
+
+		return report_datum
+
+
+	@staticmethod
+	def log_reports (reports: typing.Iterable[Report]):
+		for report in reports:
+			logger.error(ReportMessage(report=report))
+
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncReportView (ReportView):
+	"""
+	Async version of ``ReportView`` for ASGI deployments. Requires Django 4.1 or later.
+
+	Reports are decoded and validated on the event loop, unless the throttles are enabled, since they use the cache. They're then queued in the buffer if ``BUFFER_REPORTS`` is enabled,
+	otherwise they're saved in a worker thread, in a single transaction or in batches as they're decoded if ``STREAM_REPORTS`` is enabled.
+	"""
+
+	@classmethod
+	def as_view (cls, **initkwargs):
+		if django.VERSION < (4, 1):
+			raise ImproperlyConfigured("AsyncReportView requires Django 4.1 or later.")
+
+		return super().as_view(**initkwargs)
+
+
+	@staticmethod
+	async def call (function: typing.Callable, *args, in_thread: bool = False):
+		""" Calls a function in a worker thread if ``in_thread`` is set, or else on the event loop. """
+
+		if not in_thread:
+			return function(*args)
+
+		from asgiref.sync import sync_to_async
+
+		return await sync_to_async(function)(*args)
+
+
+	async def post (self, request: HttpRequest) -> HttpResponse:
+		""" Handles the POST request. """
+
+		config = apps.get_app_config('lookout')
+
+		# The throttles use the cache, whose calls block, so they're run in a worker thread when they're enabled
+		rejection = await self.call(self.reject_request, request, in_thread=config.CLIENT_RATE_LIMIT is not None)
+		if rejection is not None:
+			return rejection
+
+		throttled = bool(config.SAMPLE_RATES or config.RATE_LIMITS)
+
+		try:
+			reports = Report.objects.build_from_data(self.get_report_data(request), content_type=request.content_type, throttle=True)
+
+			if config.BUFFER_REPORTS:
+				reports = await self.call(list, reports, in_thread=throttled)
+
+				overflow = get_report_buffer().put(reports)
+				if overflow:
+					await Report.objects.asave_batch(overflow)
+
+				self.log_reports(reports)
+
+			elif config.STREAM_REPORTS:
+				batches = chunked(reports, config.BATCH_SIZE)
+
+				while True:
+					batch = await self.call(next, batches, None, in_thread=throttled)
+					if batch is None:
+						break
+
+					await Report.objects.asave_batch(batch)
+					self.log_reports(batch)
+
+			else:
+				reports = await self.call(list, reports, in_thread=throttled)
+
+				if reports:
+					await Report.objects.asave_batch(reports)
+
+				self.log_reports(reports)
+
+		except (JSONDecodeError, UnknownSchemaError, RequestTooLargeError, ContentEncodingError) as e:
+			return self.error_response(e)
+
 		# Return an empty HTTP 200
 		return HttpResponse('')
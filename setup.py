@@ -15,9 +15,9 @@ setup(
 	},
 
 	install_requires=[
-		'Django>=1.10',
-		'Pygments<3>=2.2',
-		'jsonschema<3>=2.6.0',
+		'Django>=1.11',
+		'Pygments>=2.2,<3',
+		'jsonschema>=2.6.0,<3',
 		'pytz>=2017.2'  # Not provided with Django<=1.10
 	],
 	setup_requires=[
@@ -31,6 +31,12 @@ setup(
 		],
 		'docs': [
 			'Sphinx>=1.6'
+		],
+		'orjson': [
+			'orjson'
+		],
+		'ujson': [
+			'ujson'
 		]
 	},
 	python_requires='>=3.5',